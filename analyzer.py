@@ -1,165 +1,1264 @@
+if __name__ == '__main__':
+    # `python analyzer.py` is kept as an alias of pipeline_analyzer.py. It hands over before any of
+    # this module's settings, clients or metrics exist, so the CLI's own `import analyzer` (after
+    # .env is loaded) is the only copy of them.
+    import os
+    import runpy
+    runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline_analyzer.py'), run_name='__main__')
+    raise SystemExit
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
-import yaml
-from collections import defaultdict
+import hashlib
+import functools
+import heapq
+import bisect
+from collections import defaultdict, deque
 import csv
 import time
-import openpyxl
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import PatternFill
-import pandas as pd
+import random
+import math
+import email.utils
 import logging
-from dotenv import load_dotenv, find_dotenv
 import os
-import tenacity
-
-_ = load_dotenv(override=True)
-
-# Setup logging
-logging.basicConfig(filename='pipeline_analysis.log', level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+import sys
+import pickle
+import sqlite3
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from contextlib import contextmanager, nullcontext
+import fnmatch
+
+# Settings are read from the environment when this module is imported. pipeline_analyzer.py
+# loads .env and sets up logging first; heavy modules (PyYAML, openpyxl, tenacity) are imported
+# by the functions that need them.
 
 # Replace with your actual API key
 API_KEY = os.getenv('API_KEY')
 HARNESS_ACCOUNT_ID = os.getenv('HARNESS_ACCOUNT_ID')
-BASE_URL = 'https://app.harness.io/gateway'
+HARNESS_BASE_URL = os.getenv('HARNESS_BASE_URL', 'https://app.harness.io').rstrip('/')
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '60'))
 DEBUG = False
 DEBUG_PIPELINE_NAME = "Post_PR_Release_Branch"
 
+# Crawl concurrency: CRAWL_CONCURRENCY=1 keeps the original sequential walk.
+# ENDPOINT_CONCURRENCY caps individual endpoints, e.g. "template_yaml=4,executions=8".
+# CRAWL_PREFETCH_LIMIT bounds how many pipelines are fetched ahead of the analysis.
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', '16'))
+ENDPOINT_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, limit in (item.split('=') for item in os.getenv('ENDPOINT_CONCURRENCY', '').split(',') if '=' in item)
+}
+CRAWL_PREFETCH_LIMIT = int(os.getenv('CRAWL_PREFETCH_LIMIT', '200'))
+
+# Page sizes for the paged list endpoints. Every page is walked for orgs, projects and pipelines;
+# execution summaries stop after EXECUTION_MAX_PAGES pages (0 walks them all).
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '100'))
+EXECUTION_PAGE_SIZE = int(os.getenv('EXECUTION_PAGE_SIZE', '20'))
+EXECUTION_MAX_PAGES = int(os.getenv('EXECUTION_MAX_PAGES', '1')) or None
+
+# EXECUTION_FETCH_MODE=project reads each project's recent executions in bulk (at most
+# EXECUTION_PROJECT_MAX executions from the last EXECUTION_WINDOW_DAYS days, 0 = no limit) and
+# groups them by pipeline, instead of one execution request per pipeline. Each pipeline still
+# uses at most EXECUTION_PAGE_SIZE * EXECUTION_MAX_PAGES of its most recent executions.
+EXECUTION_FETCH_MODE = os.getenv('EXECUTION_FETCH_MODE', 'pipeline')
+EXECUTION_PROJECT_PAGE_SIZE = int(os.getenv('EXECUTION_PROJECT_PAGE_SIZE', '100'))
+EXECUTION_PROJECT_MAX = int(os.getenv('EXECUTION_PROJECT_MAX', '1000'))
+EXECUTION_WINDOW_DAYS = float(os.getenv('EXECUTION_WINDOW_DAYS', '30'))
+
+# PREFILTER_NON_CI=1 classifies pipelines by the `modules` of their pipeline list entry. Pipelines
+# listed with modules that do not include ci are counted without fetching their YAML, templates
+# or executions; pipelines listed without modules take the full path.
+PREFILTER_NON_CI = os.getenv('PREFILTER_NON_CI', '0') == '1'
+
+# Persistent pipeline/template YAML cache. INLINE pipeline entries stay valid while the pipeline's
+# lastUpdatedAt is unchanged; REMOTE pipelines (which can change in git without a new lastUpdatedAt)
+# and templates expire after YAML_CACHE_TTL seconds.
+# HARNESS_OFFLINE=1 serves YAML only from the cache. An empty YAML_CACHE_PATH disables it.
+YAML_CACHE_PATH = os.getenv('YAML_CACHE_PATH', 'harness_yaml_cache.sqlite')
+YAML_CACHE_TTL = float(os.getenv('YAML_CACHE_TTL', '86400'))
+YAML_CACHE_MAX_BYTES = int(os.getenv('YAML_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+YAML_CACHE_PARSED = os.getenv('YAML_CACHE_PARSED', '0') == '1'
+HARNESS_OFFLINE = os.getenv('HARNESS_OFFLINE', '0') == '1'
+
+# Finished executions are kept in EXECUTION_CACHE_PATH (the YAML cache file by default, empty
+# disables it) as their CI build time only; later runs only ask for executions newer than those.
+EXECUTION_CACHE_PATH = os.getenv('EXECUTION_CACHE_PATH', YAML_CACHE_PATH)
+
+# Per-pipeline results of the last run are kept in PIPELINE_STATE_PATH. With INCREMENTAL=1 only
+# pipelines added or updated since then (or whose templates changed) are fetched and re-analyzed.
+PIPELINE_STATE_PATH = os.getenv('PIPELINE_STATE_PATH', 'pipeline_state.json')
+INCREMENTAL = os.getenv('INCREMENTAL', '0') == '1'
+
+# Every completed run also writes PIPELINE_INDEX_PATH: which pipelines use each template (directly
+# or through nested templates), which run on each infrastructure type, and which templates include
+# each template. `pipeline_analyzer.py query` answers from it without crawling. Empty disables it.
+PIPELINE_INDEX_PATH = os.getenv('PIPELINE_INDEX_PATH', 'pipeline_index.json')
+
+# Every completed run writes the template dependency graph it resolved to TEMPLATE_GRAPH_PATH: each
+# template's nested templates, CI stages, infrastructure and nesting height, plus cycles and
+# templates that could not be fetched. Empty disables it.
+# Scoped runs (--shard, --org/--project/--pipeline) write these three files under a name with their
+# scope added (see scoped_path), so they never replace the account-wide ones.
+TEMPLATE_GRAPH_PATH = os.getenv('TEMPLATE_GRAPH_PATH', 'template_graph.json')
+
+# Finished pipelines and projects are journaled to CRAWL_JOURNAL_PATH while the crawl runs. After a
+# crash or a kill, `--resume` skips what the journal already has. The journal is removed once a run
+# completes.
+CRAWL_JOURNAL_PATH = os.getenv('CRAWL_JOURNAL_PATH', 'crawl_journal.jsonl')
+
+# A `--shard i/n` run analyzes one of n slices of the account and also saves its raw per-org totals
+# to SHARD_PARTIAL_PATH; `pipeline_analyzer.py merge` combines the outputs of all n shard directories.
+SHARD_PARTIAL_PATH = os.getenv('SHARD_PARTIAL_PATH', 'shard_partial.json')
+
+# Pipeline details, errors and state are written as each project finishes and flushed to disk every
+# RESULT_FLUSH_ROWS rows or RESULT_FLUSH_SECONDS seconds, so a crashed run keeps what it had done.
+RESULT_FLUSH_ROWS = int(os.getenv('RESULT_FLUSH_ROWS', '100'))
+RESULT_FLUSH_SECONDS = float(os.getenv('RESULT_FLUSH_SECONDS', '5'))
+
+# Every run also writes typed, normalized tables to the SQLite file RESULT_STORE_PATH, one run_date
+# partition per day (a rerun on the same day replaces it). Empty disables the store.
+RESULT_STORE_PATH = os.getenv('RESULT_STORE_PATH', 'pipeline_results.sqlite')
+
+# update_spreadsheet replaces its sheets in SPREADSHEET_INPUT_PATH (when it exists) and saves the
+# result to SPREADSHEET_OUTPUT_PATH. An empty SPREADSHEET_OUTPUT_PATH skips the spreadsheet.
+SPREADSHEET_INPUT_PATH = os.getenv('SPREADSHEET_INPUT_PATH', 'CI-AdoptionPlan-Hosted_Builds_Migration.xlsx')
+SPREADSHEET_OUTPUT_PATH = os.getenv('SPREADSHEET_OUTPUT_PATH', 'CI-AdoptionPlan-Hosted_Builds_Migration_Updated.xlsx')
+
+# Client-side rate limiting. RATE_LIMIT_PER_SECOND caps the whole client and RATE_LIMITS caps
+# individual endpoint families, e.g. "template_yaml=5,executions=10" (0 or unset leaves a bucket
+# open until the server first throttles us). 429 and 5xx responses are retried up to HTTP_MAX_RETRIES times,
+# waiting for Retry-After when the server sends it, else with jittered exponential backoff.
+# Responses slower than HTTP_LATENCY_TARGET seconds make the client lower its concurrency.
+RATE_LIMIT_PER_SECOND = float(os.getenv('RATE_LIMIT_PER_SECOND', '0'))
+RATE_LIMITS = {
+    name.strip(): float(limit)
+    for name, limit in (item.split('=') for item in os.getenv('RATE_LIMITS', '').split(',') if '=' in item)
+}
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '5'))
+HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', '1'))
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', '60'))
+HTTP_LATENCY_TARGET = float(os.getenv('HTTP_LATENCY_TARGET', '5'))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# YAML documents are parsed with libyaml's CSafeLoader when available. Documents of at least
+# PARSE_POOL_MIN_BYTES are parsed in a pool of PARSE_WORKERS processes (0 parses in-thread), so
+# parsing uses every core while the crawl threads keep requests in flight.
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', str(max((os.cpu_count() or 1) - 1, 0))))
+PARSE_POOL_MIN_BYTES = int(os.getenv('PARSE_POOL_MIN_BYTES', '65536'))
+
+# Every run writes a JSON report of per-endpoint latencies, request/retry/error counters, bytes
+# transferred and time per phase to METRICS_REPORT_PATH, and the same metrics in Prometheus text
+# format to METRICS_PROMETHEUS_PATH if set. METRICS_TRACE=1 adds per-pipeline spans: the
+# METRICS_TRACE_TOP slowest pipelines and the time spent per org and project.
+METRICS_REPORT_PATH = os.getenv('METRICS_REPORT_PATH', 'run_report.json')
+METRICS_PROMETHEUS_PATH = os.getenv('METRICS_PROMETHEUS_PATH', '')
+METRICS_TRACE = os.getenv('METRICS_TRACE', '0') == '1'
+METRICS_TRACE_TOP = int(os.getenv('METRICS_TRACE_TOP', '20'))
+
 headers = {
     'Authorization': f'Bearer {API_KEY}',
     'Accept': 'application/json',
     'Content-Type': 'application/json'
 }
 
-# Timer function
+# Metrics
+
+class Histogram:
+    # Prometheus-style cumulative buckets, in seconds
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else 0,
+            'max': round(self.max, 6),
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99)
+        }
+
+class Metrics:
+    # Thread-safe counters and latency histograms keyed by metric name and labels, plus optional
+    # per-pipeline trace spans. Only aggregates are kept, so memory does not grow with the account.
+    def __init__(self, trace=METRICS_TRACE, trace_top=METRICS_TRACE_TOP):
+        self.lock = threading.Lock()
+        self.trace = trace
+        self.trace_top = trace_top
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = defaultdict(float)
+            self.histograms = defaultdict(Histogram)
+            self.slowest = []
+            self.span_totals = defaultdict(float)
+            self.started_at = time.time()
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.histograms[key].observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start_time, **labels)
+
+    @contextmanager
+    def span(self, org_identifier, project_identifier, pipeline_identifier):
+        if not self.trace:
+            yield
+            return
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - start_time
+            with self.lock:
+                self.span_totals[('org', org_identifier)] += seconds
+                self.span_totals[('project', f'{org_identifier}/{project_identifier}')] += seconds
+                entry = (seconds, f'{org_identifier}/{project_identifier}/{pipeline_identifier}')
+                if len(self.slowest) < self.trace_top:
+                    heapq.heappush(self.slowest, entry)
+                else:
+                    heapq.heappushpop(self.slowest, entry)
+
+    def report(self, **extra):
+        with self.lock:
+            report = {
+                'started_at': self.started_at,
+                'duration_seconds': round(time.time() - self.started_at, 3),
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(self.counters.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), **histogram.to_dict()} for (name, labels), histogram in sorted(self.histograms.items())]
+            }
+            if self.trace:
+                top = lambda kind: sorted(((name, round(seconds, 3)) for (span_kind, name), seconds in self.span_totals.items() if span_kind == kind), key=lambda item: -item[1])[:self.trace_top]
+                report['trace'] = {
+                    'slowest_pipelines': [{'pipeline': name, 'seconds': round(seconds, 3)} for seconds, name in sorted(self.slowest, reverse=True)],
+                    'slowest_orgs': [{'org': name, 'seconds': seconds} for name, seconds in top('org')],
+                    'slowest_projects': [{'project': name, 'seconds': seconds} for name, seconds in top('project')]
+                }
+        report.update(extra)
+        return report
+
+    def prometheus(self):
+        def labels_text(labels, **more):
+            items = list(labels) + list(more.items())
+            if not items:
+                return ''
+            escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in items) + '}'
+
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            # One TYPE line per metric family, before its first sample
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE pipeline_analyzer_{name} {kind}')
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                declare(name, 'counter')
+                lines.append(f'pipeline_analyzer_{name}{labels_text(labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                declare(name, 'histogram')
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'pipeline_analyzer_{name}_bucket{labels_text(labels, le=bound)} {cumulative}')
+                lines.append(f'pipeline_analyzer_{name}_sum{labels_text(labels)} {histogram.sum}')
+                lines.append(f'pipeline_analyzer_{name}_count{labels_text(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, report_path=METRICS_REPORT_PATH, prometheus_path=METRICS_PROMETHEUS_PATH, **extra):
+        if report_path:
+            with open(report_path, 'w') as report_file:
+                json.dump(self.report(**extra), report_file, indent=2, default=str)
+        if prometheus_path:
+            with open(prometheus_path, 'w') as prometheus_file:
+                prometheus_file.write(self.prometheus())
+
+metrics = Metrics()
+
+def backoff_delay(attempt):
+    # Full jitter: anywhere between 0 and the exponential cap, so throttled threads spread out
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+def retry_after_seconds(response):
+    # Capped at HTTP_BACKOFF_MAX: one huge Retry-After would otherwise stall the whole account bucket
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), HTTP_BACKOFF_MAX)
+
+class TokenBucket:
+    # Request rate for one endpoint family. Without a configured rate the bucket is open until the
+    # server throttles us; from then on the rate drops by `decrease` on every 429 and grows back by
+    # at least one request per second, or `increase` of itself, each second while requests succeed.
+    window = 10.0
+    min_rate = 0.5
+    decrease = 0.7
+    increase = 0.05
+    cooldown = 1.0
+
+    def __init__(self, rate=None, max_rate=None):
+        self.rate = rate or None
+        self.max_rate = max_rate or None
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self.decreased_at = 0.0
+        self.sent = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.resume_at - now
+                if wait <= 0 and self.rate is not None:
+                    self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0
+                if wait <= 0:
+                    if self.rate is not None:
+                        self.tokens -= 1
+                    self.sent.append(now)
+                    while now - self.sent[0] > self.window:
+                        self.sent.popleft()
+                    return
+            time.sleep(wait)
+
+    def throttled(self, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            if retry_after:
+                self.resume_at = max(self.resume_at, now + retry_after)
+            # Requests already in flight get throttled together; that is one signal, not many
+            if now - self.decreased_at < self.cooldown:
+                return
+            self.decreased_at = now
+            # The first throttle starts from the rate we were actually sending at
+            current = self.rate if self.rate is not None else len(self.sent) / max(now - self.sent[0], 1.0) if self.sent else 1.0
+            self.rate = max(self.min_rate, current * self.decrease)
+            self.tokens = 0.0
+            self.updated = now
+
+    def succeeded(self):
+        with self.lock:
+            if self.rate is not None:
+                self.rate += max(1 / self.rate, self.increase)
+                if self.max_rate:
+                    self.rate = min(self.rate, self.max_rate)
+
+class AdaptiveConcurrency:
+    # Caps the requests in flight. Halved when the server throttles us, lowered a little when
+    # responses get slower than the latency target, raised back slowly while they are fast.
+    def __init__(self, max_limit, latency_target=HTTP_LATENCY_TARGET):
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.decreased_at = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency=None, throttled=False):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self.decreased_at >= TokenBucket.cooldown:
+                    self.decreased_at = now
+                    self.limit = max(1.0, self.limit / 2)
+            elif latency is not None and latency > self.latency_target:
+                self.limit = max(1.0, self.limit * 0.9)
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+class HarnessClient:
+    # Shared HTTP client for every Harness API call: one keep-alive connection pool sized to the
+    # crawl concurrency, gzip responses and connect/read timeouts. Point base_url at a local
+    # stand-in to run the analyzer without touching app.harness.io.
+    # Requests are paced by a token bucket per endpoint family and an adaptive in-flight limit;
+    # throttled and 5xx responses are retried here before callers see them.
+    # A recorder, if given, captures every response handed back to a caller (see mock_harness).
+    def __init__(self, base_url=None, pool_size=None, timeout=None, rate_limit=None, rate_limits=None, max_retries=HTTP_MAX_RETRIES, recorder=None):
+        self.base_url = (base_url or HARNESS_BASE_URL).rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        pool_size = pool_size or max(CRAWL_CONCURRENCY, 1)
+        self.rate_limits = RATE_LIMITS if rate_limits is None else rate_limits
+        self.max_retries = max_retries
+        rate_limit = RATE_LIMIT_PER_SECOND if rate_limit is None else rate_limit
+        self.account_bucket = TokenBucket(rate_limit, rate_limit)
+        self.buckets = {}
+        self.concurrency = AdaptiveConcurrency(pool_size)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'throttled': 0, 'server_errors': 0, 'retries': 0}
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.session.headers['Connection'] = 'keep-alive'
+        # Kept-alive connections can be dropped by the server between requests; reconnect on those
+        # instead of failing the call. Harness list endpoints are POST but read-only, so all methods qualify.
+        retries = Retry(total=2, connect=2, read=1, status=0, other=0, allowed_methods=None, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def bucket(self, endpoint):
+        with self.lock:
+            if endpoint not in self.buckets:
+                rate = self.rate_limits.get(endpoint)
+                self.buckets[endpoint] = TokenBucket(rate, rate)
+            return self.buckets[endpoint]
+
+    def request(self, method, url, endpoint='default', label=None, **kwargs):
+        # label splits an endpoint family in the metrics only, e.g. REMOTE pipeline YAML
+        label = label or endpoint
+        kwargs.setdefault('timeout', self.timeout)
+        bucket = self.bucket(endpoint)
+        call_start = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            wait_start = time.monotonic()
+            self.account_bucket.acquire()
+            bucket.acquire()
+            self.concurrency.acquire()
+            start_time = time.monotonic()
+            metrics.observe('http_wait_seconds', start_time - wait_start, endpoint=label)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except BaseException as e:
+                self.concurrency.release()
+                metrics.count('http_errors_total', endpoint=label, error=type(e).__name__)
+                raise
+            throttled = response.status_code == 429
+            latency = time.monotonic() - start_time
+            self.concurrency.release(latency, throttled)
+            metrics.observe('http_request_seconds', latency, endpoint=label)
+            metrics.count('http_requests_total', endpoint=label, status=response.status_code)
+            metrics.count('http_response_bytes_total', len(response.content), endpoint=label)
+            with self.lock:
+                self.stats['requests'] += 1
+                if throttled:
+                    self.stats['throttled'] += 1
+                elif response.status_code in RETRY_STATUSES:
+                    self.stats['server_errors'] += 1
+            if response.status_code not in RETRY_STATUSES:
+                self.account_bucket.succeeded()
+                bucket.succeeded()
+                metrics.observe('http_call_seconds', time.monotonic() - call_start, endpoint=label)
+                if self.recorder:
+                    self.recorder.record(method, url[len(self.base_url):], kwargs.get('json'), response)
+                return response
+            retry_after = retry_after_seconds(response)
+            if throttled:
+                # Harness limits are per account, so a 429 slows the whole client down; a family
+                # bucket only adapts when it has a rate of its own
+                self.account_bucket.throttled(retry_after)
+                if bucket.rate is not None:
+                    bucket.throttled(retry_after)
+            if attempt == self.max_retries:
+                metrics.observe('http_call_seconds', time.monotonic() - call_start, endpoint=label)
+                if self.recorder:
+                    self.recorder.record(method, url[len(self.base_url):], kwargs.get('json'), response)
+                return response
+            delay = retry_after + random.uniform(0, HTTP_BACKOFF_BASE) if retry_after is not None else backoff_delay(attempt)
+            logging.warning(f'HTTP {response.status_code} from {endpoint}, retrying in {delay:.1f}s: {url}')
+            with self.lock:
+                self.stats['retries'] += 1
+            metrics.count('http_retries_total', endpoint=label, status=response.status_code)
+            metrics.observe('http_retry_wait_seconds', delay, endpoint=label)
+            response.close()
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def rates(self):
+        with self.lock:
+            buckets = dict(self.buckets)
+        buckets['account'] = self.account_bucket
+        return {endpoint: round(bucket.rate, 1) for endpoint, bucket in buckets.items() if bucket.rate is not None}
+
+    def close(self):
+        self.session.close()
+        if self.recorder:
+            self.recorder.close()
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+def get_http_client():
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HarnessClient()
+        return _http_client
+
+def set_http_client(client):
+    global _http_client
+    with _http_client_lock:
+        _http_client = client
+
+class YamlCache:
+    # SQLite-backed cache for the raw YAML (and optionally the parsed document) of pipelines and
+    # templates. Keys carry the full account/org/project scope, the template versionLabel and the
+    # git connector/repo of REMOTE pipelines.
+    def __init__(self, path=YAML_CACHE_PATH, ttl=YAML_CACHE_TTL, max_bytes=YAML_CACHE_MAX_BYTES, store_parsed=YAML_CACHE_PARSED, offline=HARNESS_OFFLINE):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.store_parsed = store_parsed
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'stores': 0, 'evictions': 0}
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS yaml_cache (
+                cache_key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                account_identifier TEXT,
+                org_identifier TEXT,
+                project_identifier TEXT,
+                identifier TEXT NOT NULL,
+                version_label TEXT,
+                connector_ref TEXT,
+                repo_name TEXT,
+                version TEXT,
+                yaml TEXT NOT NULL,
+                parsed BLOB,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS yaml_cache_accessed_at ON yaml_cache (accessed_at)')
+        if not offline:
+            # Unversioned (template and REMOTE pipeline) entries past their TTL are dropped up front
+            self.connection.execute('DELETE FROM yaml_cache WHERE version IS NULL AND stored_at < ?', (time.time() - ttl,))
+        self.total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM yaml_cache').fetchone()[0]
+
+    def get(self, key, version=None):
+        cache_key = '\x1f'.join('' if part is None else str(part) for part in key)
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute('SELECT yaml, parsed, version, stored_at FROM yaml_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            raw_yaml, parsed, cached_version, stored_at = row
+            if not self.offline:
+                expired = cached_version != str(version) if version is not None else now - stored_at > self.ttl
+                if expired:
+                    self.stats['stale'] += 1
+                    return None
+            self.stats['hits'] += 1
+            self.connection.execute('UPDATE yaml_cache SET accessed_at = ? WHERE cache_key = ?', (now, cache_key))
+        return raw_yaml, pickle.loads(parsed) if parsed is not None else None
+
+    def put(self, key, raw_yaml, parsed=None, version=None):
+        cache_key = '\x1f'.join('' if part is None else str(part) for part in key)
+        parsed_blob = pickle.dumps(parsed, protocol=pickle.HIGHEST_PROTOCOL) if self.store_parsed and parsed is not None else None
+        size = len(raw_yaml) + (len(parsed_blob) if parsed_blob else 0)
+        now = time.time()
+        with self.lock:
+            previous = self.connection.execute('SELECT size FROM yaml_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+            self.connection.execute(
+                'INSERT OR REPLACE INTO yaml_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (cache_key, *key, None if version is None else str(version), raw_yaml, parsed_blob, size, now, now)
+            )
+            self.stats['stores'] += 1
+            self.total_bytes += size - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+
+    def _evict(self, target_bytes):
+        # Least recently used entries go first
+        for cache_key, size in self.connection.execute('SELECT cache_key, size FROM yaml_cache ORDER BY accessed_at').fetchall():
+            if self.total_bytes <= target_bytes:
+                break
+            self.connection.execute('DELETE FROM yaml_cache WHERE cache_key = ?', (cache_key,))
+            self.total_bytes -= size
+            self.stats['evictions'] += 1
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+def pipeline_cache_key(org_identifier, project_identifier, pipeline_identifier, store_type, connector_ref=None, repo_name=None):
+    remote = store_type != 'INLINE'
+    return ('pipeline', HARNESS_ACCOUNT_ID, org_identifier, project_identifier, pipeline_identifier, None,
+            connector_ref if remote else None, repo_name if remote else None)
+
+def template_key(template_ref, version_label=None, current_level='account', org_identifier=None, project_identifier=None):
+    # Fully qualified (scope, org, project, identifier, versionLabel) of a templateRef as seen from
+    # current_level. A missing versionLabel means the template's stable version.
+    if template_ref.startswith('account.'):
+        return ('account', None, None, template_ref[len('account.'):], version_label)
+    if template_ref.startswith('org.'):
+        return ('org', org_identifier, None, template_ref[len('org.'):], version_label)
+    if current_level == 'project':
+        return ('project', org_identifier, project_identifier, template_ref, version_label)
+    if current_level == 'org':
+        return ('org', org_identifier, None, template_ref, version_label)
+    return ('account', None, None, template_ref, version_label)
+
+def template_cache_key(template_ref, version_label, current_level, org_identifier=None, project_identifier=None):
+    scope, org_identifier, project_identifier, template_id, version_label = template_key(template_ref, version_label, current_level, org_identifier, project_identifier)
+    return ('template', HARNESS_ACCOUNT_ID, org_identifier, project_identifier, template_id, version_label, None, None)
+
+_yaml_cache = None
+
+def get_yaml_cache():
+    global _yaml_cache
+    if not YAML_CACHE_PATH:
+        return None
+    with _http_client_lock:
+        if _yaml_cache is None:
+            _yaml_cache = YamlCache()
+        return _yaml_cache
+
+def is_transient_error(exception):
+    # Throttled and 5xx responses were already retried by HarnessClient
+    return isinstance(exception, requests.exceptions.RequestException) and not isinstance(exception, requests.exceptions.HTTPError)
+
+def retry_transient_errors(func):
+    # The tenacity retry is built on the first call, so commands that never call the API skip the import
+    retrying = None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal retrying
+        if retrying is None:
+            import tenacity
+            retrying = tenacity.retry(
+                stop=tenacity.stop_after_attempt(3),
+                wait=tenacity.wait_random_exponential(multiplier=HTTP_BACKOFF_BASE, max=HTTP_BACKOFF_MAX),
+                retry=tenacity.retry_if_exception(is_transient_error),
+                before_sleep=lambda retry_state: metrics.count('call_retries_total', function=retry_state.fn.__name__),
+                reraise=True
+            )(func)
+        return retrying(*args, **kwargs)
+    return wrapper
+
+# YAML parsing
+
+def load_yaml(raw_yaml):
+    import yaml
+    return yaml.load(raw_yaml, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+def prune_stage(stage_data):
+    if not isinstance(stage_data, dict):
+        return stage_data
+    pruned = {key: stage_data[key] for key in ('name', 'identifier', 'type') if key in stage_data}
+    template = stage_data.get('template')
+    if 'template' in stage_data:
+        pruned['template'] = {key: template[key] for key in ('templateRef', 'versionLabel') if key in template} if isinstance(template, dict) else template
+    template_inputs = stage_data.get('templateInputs')
+    if isinstance(template_inputs, dict) and 'type' in template_inputs:
+        pruned['templateInputs'] = {'type': template_inputs['type']}
+    if 'spec' in stage_data:
+        spec = stage_data['spec']
+        pruned['spec'] = {'infrastructure': spec['infrastructure']} if isinstance(spec, dict) and 'infrastructure' in spec else {} if isinstance(spec, dict) else spec
+    return pruned
+
+def prune_stages(stages):
+    # One entry per stage, so stage counts stay the same
+    if not isinstance(stages, list):
+        return stages
+    pruned = []
+    for stage in stages:
+        if isinstance(stage, dict) and 'stage' in stage:
+            pruned.append({'stage': prune_stage(stage['stage'])})
+        elif isinstance(stage, dict) and 'parallel' in stage:
+            pruned.append({'parallel': prune_stages(stage['parallel'])})
+        elif isinstance(stage, dict):
+            pruned.append({})
+        else:
+            pruned.append(stage)
+    return pruned
+
+def prune_document(document, kind):
+    # Keeps only what process_stages and analyze_pipeline read, so parsed documents are cheap to
+    # send back from the parse pool, to cache and to walk
+    if DEBUG or not isinstance(document, dict) or not isinstance(document.get(kind), dict):
+        return document
+    body = document[kind]
+    pruned = {key: body[key] for key in ('name', 'identifier', 'type') if key in body}
+    if kind == 'pipeline':
+        template = body.get('template')
+        if 'template' in body:
+            pruned['template'] = {key: template[key] for key in ('templateRef', 'versionLabel') if key in template} if isinstance(template, dict) else template
+        if 'stages' in body:
+            pruned['stages'] = prune_stages(body['stages'])
+    elif isinstance(body.get('spec'), dict):
+        spec = body['spec']
+        pruned['spec'] = {key: spec[key] for key in ('type', 'infrastructure') if key in spec}
+        if 'stages' in spec:
+            pruned['spec']['stages'] = prune_stages(spec['stages'])
+    elif 'spec' in body:
+        pruned['spec'] = body['spec']
+    return {kind: pruned}
+
+def parse_yaml_document(raw_yaml, kind):
+    # Runs in the parse pool (or inline for small documents); returns (document, error)
+    import yaml
+    try:
+        return prune_document(load_yaml(raw_yaml), kind), None
+    except yaml.YAMLError as yaml_error:
+        return None, f'Error parsing YAML: {yaml_error}'
+
+_parse_pool = None
+
+def get_parse_pool():
+    global _parse_pool
+    if PARSE_WORKERS <= 0:
+        return None
+    with _http_client_lock:
+        if _parse_pool is None:
+            # spawn, not fork: the crawl threads are already running when the pool starts
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _parse_pool
+
+def parse_yaml(raw_yaml, kind):
+    pool = get_parse_pool() if len(raw_yaml) >= PARSE_POOL_MIN_BYTES else None
+    metrics.count('yaml_parsed_bytes_total', len(raw_yaml), kind=kind)
+    with metrics.timer('phase_seconds', phase='yaml_parse'):
+        if pool is None:
+            return parse_yaml_document(raw_yaml, kind)
+        return pool.submit(parse_yaml_document, raw_yaml, kind).result()
+
+def close_parse_pool():
+    global _parse_pool
+    with _http_client_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=True, cancel_futures=True)
+            _parse_pool = None
+
+# Timer function. It wraps the retry decorator, so the time includes retries and their waits.
 def timer_func(func):
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        print(f"{func.__name__} took {end_time - start_time:.2f} seconds")
-        return result
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end_time = time.time()
+            metrics.observe('call_seconds', end_time - start_time, function=func.__name__)
+            logging.debug(f'{func.__name__} took {end_time - start_time:.2f} seconds')
     return wrapper
 
-@tenacity.retry(
-    stop=tenacity.stop_after_attempt(3),
-    wait=tenacity.wait_fixed(5),
-    retry=tenacity.retry_if_exception_type(requests.exceptions.RequestException),
-    reraise=True
-)
+# Pagination
+
+_page_executor = None
+
+def get_page_executor():
+    global _page_executor
+    with _http_client_lock:
+        if _page_executor is None:
+            _page_executor = ThreadPoolExecutor(max_workers=max(CRAWL_CONCURRENCY, 2), thread_name_prefix='page')
+        return _page_executor
+
+def iter_pages(fetch_page, page_size, max_pages=None):
+    # Yields the content of every page lazily. The next page is requested in the background while
+    # the current one is consumed, so only about two pages are held in memory at a time.
+    # fetch_page(page) returns the response 'data' object, or None to stop.
+    page = 0
+    future = get_page_executor().submit(fetch_page, page)
+    while future is not None:
+        data = future.result()
+        if not data:
+            return
+        content = data.get('content') or []
+        total_pages = data.get('totalPages')
+        has_next = page + 1 < total_pages if total_pages is not None else len(content) >= page_size
+        if has_next and content and (max_pages is None or page + 1 < max_pages):
+            page += 1
+            future = get_page_executor().submit(fetch_page, page)
+        else:
+            future = None
+        yield from content
+
 @timer_func
-def get_orgs():
-    url = f'{BASE_URL}/ng/api/organizations?accountIdentifier={HARNESS_ACCOUNT_ID}&pageSize=500'
+@retry_transient_errors
+def get_orgs_page(page, page_size=PAGE_SIZE):
+    client = get_http_client()
+    url = f'{client.base_url}/gateway/ng/api/organizations?accountIdentifier={HARNESS_ACCOUNT_ID}&pageIndex={page}&pageSize={page_size}'
     print(f'Fetching orgs: {url}')
-    response = requests.get(url, headers=headers)
+    response = client.get(url, endpoint='orgs')
     response.raise_for_status()
-    return response.json()['data']['content']
-
-@tenacity.retry(
-    stop=tenacity.stop_after_attempt(3),
-    wait=tenacity.wait_fixed(5),
-    retry=tenacity.retry_if_exception_type(requests.exceptions.RequestException),
-    reraise=True
-)
+    return response.json()['data']
+
+def iter_orgs(page_size=PAGE_SIZE):
+    return iter_pages(lambda page: get_orgs_page(page, page_size), page_size)
+
+def get_orgs():
+    return list(iter_orgs())
+
 @timer_func
-def get_projects(org_identifier):
-    url = f'{BASE_URL}/ng/api/aggregate/projects?routingId={HARNESS_ACCOUNT_ID}&accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&pageIndex=0&pageSize=500&sortOrders=createdAt%2CDESC'
+@retry_transient_errors
+def get_projects_page(org_identifier, page, page_size=PAGE_SIZE):
+    client = get_http_client()
+    url = f'{client.base_url}/gateway/ng/api/aggregate/projects?routingId={HARNESS_ACCOUNT_ID}&accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&pageIndex={page}&pageSize={page_size}&sortOrders=createdAt%2CDESC'
     print(f'Fetching projects for org {org_identifier}: {url}')
-    response = requests.get(url, headers=headers)
+    response = client.get(url, endpoint='projects')
     response.raise_for_status()
-    return response.json()['data']['content']
-
-@tenacity.retry(
-    stop=tenacity.stop_after_attempt(3),
-    wait=tenacity.wait_fixed(5),
-    retry=tenacity.retry_if_exception_type(requests.exceptions.RequestException),
-    reraise=True
-)
+    return response.json()['data']
+
+def iter_projects(org_identifier, page_size=PAGE_SIZE):
+    return iter_pages(lambda page: get_projects_page(org_identifier, page, page_size), page_size)
+
+def get_projects(org_identifier):
+    return list(iter_projects(org_identifier))
+
 @timer_func
-def get_pipelines(org_identifier, project_identifier):
-    url = f'{BASE_URL}/pipeline/api/pipelines/list?routingId={HARNESS_ACCOUNT_ID}&accountIdentifier={HARNESS_ACCOUNT_ID}&projectIdentifier={project_identifier}&orgIdentifier={org_identifier}&page=0&sort=lastUpdatedAt%2CDESC&size=500'
+@retry_transient_errors
+def get_pipelines_page(org_identifier, project_identifier, page, page_size=PAGE_SIZE):
+    client = get_http_client()
+    url = f'{client.base_url}/gateway/pipeline/api/pipelines/list?routingId={HARNESS_ACCOUNT_ID}&accountIdentifier={HARNESS_ACCOUNT_ID}&projectIdentifier={project_identifier}&orgIdentifier={org_identifier}&page={page}&sort=lastUpdatedAt%2CDESC&size={page_size}'
     data = {
         "filterType": "PipelineSetup"
     }
-    response = requests.post(url, headers=headers, json=data)  # Fix this line
+    response = client.post(url, json=data, endpoint='pipelines')
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError as e:
         print(f'Error fetching pipelines: {e}\nURL: {url}\nResponse: {response.text}')
+        logging.error(f'Error fetching pipelines for {org_identifier}/{project_identifier}: {e}')
+        # Still throttled or failing after the client's retries: stop rather than undercount
+        if response.status_code in RETRY_STATUSES:
+            raise
         return None
-    return response.json()['data']['content']
-
-@tenacity.retry(
-    stop=tenacity.stop_after_attempt(3),
-    wait=tenacity.wait_fixed(5),
-    retry=tenacity.retry_if_exception_type(requests.exceptions.RequestException),
-    reraise=True
-)
+    return response.json()['data']
+
+def iter_pipelines(org_identifier, project_identifier, page_size=PAGE_SIZE):
+    return iter_pages(lambda page: get_pipelines_page(org_identifier, project_identifier, page, page_size), page_size)
+
+def get_pipelines(org_identifier, project_identifier):
+    return list(iter_pipelines(org_identifier, project_identifier))
+
 @timer_func
-def get_pipeline_yaml(org_identifier, project_identifier, pipeline_identifier, store_type, connector_ref=None, repo_name=None):
+@retry_transient_errors
+def get_pipeline_yaml(org_identifier, project_identifier, pipeline_identifier, store_type, connector_ref=None, repo_name=None, last_updated=None):
+    client = get_http_client()
     if store_type == "INLINE":
-        url = f'{BASE_URL}/pipeline/api/pipelines/{pipeline_identifier}?accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&projectIdentifier={project_identifier}&validateAsync=true'
+        url = f'{client.base_url}/gateway/pipeline/api/pipelines/{pipeline_identifier}?accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&projectIdentifier={project_identifier}&validateAsync=true'
+    else:
+        url = f'{client.base_url}/gateway/pipeline/api/pipelines/{pipeline_identifier}?accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&projectIdentifier={project_identifier}&validateAsync=true&loadFromFallbackBranch=true&parentEntityConnectorRef={connector_ref}&parentEntityRepoName={repo_name}'
+
+    cache = get_yaml_cache()
+    cache_key = pipeline_cache_key(org_identifier, project_identifier, pipeline_identifier, store_type, connector_ref, repo_name)
+    # lastUpdatedAt does not move when a REMOTE pipeline changes in git, so those expire by TTL instead
+    version = last_updated if store_type == 'INLINE' else None
+    cached = cache.get(cache_key, version=version) if cache else None
+    if cached:
+        yaml_pipeline, parsed_yaml = cached
+        if parsed_yaml is not None:
+            return parsed_yaml, None
+    elif cache and cache.offline:
+        return None, f'Pipeline YAML for {pipeline_identifier} is not cached (offline mode)'
     else:
-        url = f'{BASE_URL}/pipeline/api/pipelines/{pipeline_identifier}?accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&projectIdentifier={project_identifier}&validateAsync=true&loadFromFallbackBranch=true&parentEntityConnectorRef={connector_ref}&parentEntityRepoName={repo_name}'
-    
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        yaml_pipeline = response.json()['data']['yamlPipeline']
         try:
-            parsed_yaml = yaml.safe_load(yaml_pipeline)
-        except yaml.YAMLError as yaml_error:
-            logging.error(f'Error parsing YAML: {yaml_error}\nYAML content: {yaml_pipeline}')
-            return None, f'Error parsing YAML: {yaml_error}'
-        return parsed_yaml, None
-    except requests.exceptions.HTTPError as e:
-        logging.error(f'Error fetching pipeline YAML: {e}\nURL: {url}\nResponse: {response.text}')
-        return None, str(e)
-    except requests.exceptions.ConnectionError as e:
-        logging.error(f'Connection error: {e}\nURL: {url}')
-        return None, str(e)
-
-@tenacity.retry(
-    stop=tenacity.stop_after_attempt(3),
-    wait=tenacity.wait_fixed(5),
-    retry=tenacity.retry_if_exception_type(requests.exceptions.RequestException),
-    reraise=True
-)
+            response = client.get(url, endpoint='pipeline_yaml', label='pipeline_yaml_remote' if store_type == 'REMOTE' else None)
+            response.raise_for_status()
+            yaml_pipeline = response.json()['data']['yamlPipeline']
+        except requests.exceptions.HTTPError as e:
+            logging.error(f'Error fetching pipeline YAML: {e}\nURL: {url}\nResponse: {response.text}')
+            return None, str(e)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            logging.error(f'Connection error: {e}\nURL: {url}')
+            return None, str(e)
+
+    parsed_yaml, error = parse_yaml(yaml_pipeline, 'pipeline')
+    if cache and not cached:
+        cache.put(cache_key, yaml_pipeline, parsed_yaml, version=version)
+    if error:
+        logging.error(f'{error}\nYAML content: {yaml_pipeline}')
+        return None, error
+    return parsed_yaml, None
+
 @timer_func
-def get_template_yaml(template_ref, version_label='0.0.1', current_level='account', org_identifier=None, project_identifier=None, parent_pipeline_id=None):
-    if template_ref.startswith('account.'):
-        template_id = template_ref.replace('account.', '')
-        url = f'{BASE_URL}/template/api/templates/{template_id}?accountIdentifier={HARNESS_ACCOUNT_ID}&versionLabel={version_label}&loadFromFallbackBranch=true'
-    elif template_ref.startswith('org.'):
-        template_id = template_ref.replace('org.', '')
-        url = f'{BASE_URL}/template/api/templates/{template_id}?accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&loadFromFallbackBranch=true'
+@retry_transient_errors
+def get_template_yaml(template_ref, version_label=None, current_level='account', org_identifier=None, project_identifier=None, parent_pipeline_id=None):
+    client = get_http_client()
+    if current_level not in ('project', 'org', 'account') and not template_ref.startswith(('account.', 'org.')):
+        return None, f'Unknown level: {current_level} for template reference: {template_ref}'
+    scope, org_identifier, project_identifier, template_id, version_label = template_key(template_ref, version_label, current_level, org_identifier, project_identifier)
+    url = f'{client.base_url}/gateway/template/api/templates/{template_id}?accountIdentifier={HARNESS_ACCOUNT_ID}&loadFromFallbackBranch=true'
+    if scope in ('org', 'project'):
+        url += f'&orgIdentifier={org_identifier}'
+    if scope == 'project':
+        url += f'&projectIdentifier={project_identifier}'
+    if version_label:
+        url += f'&versionLabel={version_label}'
+
+    cache = get_yaml_cache()
+    cache_key = template_cache_key(template_ref, version_label, current_level, org_identifier, project_identifier)
+    cached = cache.get(cache_key) if cache else None
+    if cached:
+        raw_yaml, template_yaml = cached
+        error = None
+        if template_yaml is None:
+            template_yaml, error = parse_yaml(raw_yaml, 'template')
+    elif cache and cache.offline:
+        return None, f'Template YAML for {template_ref} is not cached (offline mode)'
     else:
-        # Default to current level logic
-        if current_level == 'project':
-            url = f'{BASE_URL}/template/api/templates/{template_ref}?accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&projectIdentifier={project_identifier}&loadFromFallbackBranch=true'
-        elif current_level == 'org':
-            url = f'{BASE_URL}/template/api/templates/{template_ref}?accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&loadFromFallbackBranch=true'
-        elif current_level == 'account':
-            url = f'{BASE_URL}/template/api/templates/{template_ref}?accountIdentifier={HARNESS_ACCOUNT_ID}&versionLabel={version_label}&loadFromFallbackBranch=true'
-        else:
-            return None, f'Unknown level: {current_level} for template reference: {template_ref}'
+        try:
+            response = client.get(url, endpoint='template_yaml')
+            response.raise_for_status()
+            raw_yaml = response.json()['data']['yaml']
+        except requests.exceptions.HTTPError as e:
+            logging.error(f'Error fetching template YAML: {e}\nURL: {url}\nResponse: {response.text}')
+            return None, str(e)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            logging.error(f'Connection error: {e}\nURL: {url}')
+            return None, str(e)
+        template_yaml, error = parse_yaml(raw_yaml, 'template')
+        if cache:
+            cache.put(cache_key, raw_yaml, template_yaml)
+
+    if error:
+        logging.error(f'{error} in template {template_ref}\nYAML content: {raw_yaml}')
+        return None, error
+    if parent_pipeline_id == DEBUG_PIPELINE_NAME and DEBUG == True:
+        logging.info(f'Template YAML fetched for {template_ref}: {template_yaml}')
+    return template_yaml, None
+
+# Template resolution
+
+def fetch_template(key, parent_pipeline_id=None):
+    scope, org_identifier, project_identifier, template_id, version_label = key
+    return get_template_yaml(template_id, version_label=version_label, current_level=scope, org_identifier=org_identifier, project_identifier=project_identifier, parent_pipeline_id=parent_pipeline_id)
+
+def stage_template_keys(stages, current_level, org_identifier, project_identifier):
+    # Keys of the templates a stage list references, as process_stages will resolve them
+    for stage in stages or []:
+        if not isinstance(stage, dict):
+            continue
+        if 'stage' in stage:
+            template = stage['stage'].get('template') or {}
+            if isinstance(template, dict) and 'templateRef' in template:
+                yield template_key(template['templateRef'], template.get('versionLabel'), current_level, org_identifier, project_identifier)
+        elif 'parallel' in stage:
+            yield from stage_template_keys(stage['parallel'], current_level, org_identifier, project_identifier)
+
+def strongly_connected_components(nodes, edges):
+    # Tarjan's algorithm without recursion. edges(node) lists the nodes it references; components
+    # come out referenced-first, so every component follows all the components it depends on.
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(edges(root)))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(edges(child))))
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+class TemplateResolver:
+    # Resolves templates by fully qualified key over their dependency graph. Resolving a template
+    # first fetches every template it reaches, one level of nesting at a time (a level's fetches go
+    # out together while a crawl engine runs), then analyzes each of them once, nested templates
+    # before the templates that include them. Templates on a cycle all get the same cycle error, so
+    # a result never depends on which pipeline reached the template first. Each template is
+    # fetched at most once, even when several threads ask for it at the same moment, and its
+    # analysis (CI stage count, infrastructure, nested templates) is memoized.
+    def __init__(self, submit=None):
+        self.lock = threading.Lock()
+        self.submit = submit
+        self.fetches = {}
+        self.edges = {}
+        self.results = {}
+        self.fingerprints = {}
+        self.local = threading.local()
+        self.stats = {'fetched': 0, 'analyzed': 0, 'reused': 0, 'errors': 0, 'cycles': 0}
+
+    def prefetch(self, key, submit):
+        # Starts a background fetch unless the template is already known; returns the new future
+        with self.lock:
+            if key in self.fetches:
+                return None
+            future = self.fetches[key] = submit('template_yaml', fetch_template, key)
+            self.stats['fetched'] += 1
+        return future
+
+    def fetch(self, key, parent_pipeline_id=None):
+        # Single flight: the first caller fetches, concurrent callers wait on the same future
+        with self.lock:
+            future = self.fetches.get(key)
+            owner = future is None
+            if owner:
+                future = self.fetches[key] = Future()
+                self.stats['fetched'] += 1
+        if owner:
+            try:
+                future.set_result(fetch_template(key, parent_pipeline_id))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def fingerprint(self, key):
+        with self.lock:
+            if key in self.fingerprints:
+                return self.fingerprints[key]
+        template_yaml, _ = self.fetch(key)
+        fingerprint = template_fingerprint(template_yaml)
+        with self.lock:
+            self.fingerprints[key] = fingerprint
+        return fingerprint
+
+    def nested(self, key):
+        # Templates referenced by the stages of a template, as process_stages resolves them
+        with self.lock:
+            if key in self.edges:
+                return self.edges[key]
+        template_yaml, _ = self.fetch(key)
+        scope, org_identifier, project_identifier, _, _ = key
+        stages = (template_yaml or {}).get('template', {}).get('spec', {}).get('stages', [])
+        nested = tuple(dict.fromkeys(stage_template_keys(stages, scope, org_identifier, project_identifier)))
+        with self.lock:
+            return self.edges.setdefault(key, nested)
+
+    @contextmanager
+    def track(self):
+        # Collects the keys resolved directly by the enclosed analysis
+        frames = self._frames()
+        frames.append(set())
+        try:
+            yield frames[-1]
+        finally:
+            frames.pop()
+
+    def _frames(self):
+        if not hasattr(self.local, 'frames'):
+            self.local.frames = []
+        return self.local.frames
+
+    def resolve(self, key, parent_pipeline_id=None):
+        frames = self._frames()
+        if frames:
+            frames[-1].add(key)
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.stats['reused'] += 1
+                return result
+        self.evaluate(key, parent_pipeline_id)
+        with self.lock:
+            return self.results[key]
+
+    def expand(self, key):
+        # Every template key reaches that is not analyzed yet, fetched level by level
+        reached = {key: None}
+        level = [key]
+        while level:
+            if self.submit:
+                for level_key in level:
+                    self.prefetch(level_key, self.submit)
+            next_level = []
+            for level_key in level:
+                for nested_key in self.nested(level_key):
+                    with self.lock:
+                        analyzed = nested_key in self.results
+                    if not analyzed and nested_key not in reached:
+                        reached[nested_key] = None
+                        next_level.append(nested_key)
+            level = next_level
+        return list(reached)
+
+    def evaluate(self, key, parent_pipeline_id=None):
+        # Analyzes key and everything below it, bottom-up
+        pending = set(self.expand(key))
+        components = strongly_connected_components(list(pending), lambda node: [nested_key for nested_key in self.nested(node) if nested_key in pending])
+        for component in components:
+            if len(component) > 1 or component[0] in self.nested(component[0]):
+                logging.error(f'Template cycle: {" -> ".join(template_label(member) for member in reversed(component))}')
+                with self.lock:
+                    self.stats['cycles'] += len(component)
+                for member in component:
+                    self._store(member, {'type': None, 'ci_stages': 0, 'infra': frozenset(), 'templates_used': frozenset(), 'error': 'Template cycle'})
+                continue
+            node = component[0]
+            template_yaml, error = self.fetch(node, parent_pipeline_id)
+            # Nested templates resolved by this analysis are the template's, not the pipeline's
+            frames = self._frames()
+            frames.append(set())
+            try:
+                result = self._analyze(node, template_yaml, error, parent_pipeline_id)
+            finally:
+                frames.pop()
+            self._store(node, result)
+
+    def _store(self, key, result):
+        result['nested'] = frozenset(self.nested(key))
+        with self.lock:
+            # Threads that analyzed the same template concurrently all end up with the first result
+            if key not in self.results:
+                self.results[key] = result
+                self.stats['analyzed'] += 1
+
+    def graph(self):
+        # Every fetched template with its nested templates, its analysis and its height: the
+        # longest chain of nested templates below it (None on a cycle)
+        with self.lock:
+            keys = list(self.fetches)
+        for key in keys:
+            with self.lock:
+                analyzed = key in self.results
+            if not analyzed:
+                self.evaluate(key)
+        with self.lock:
+            keys = sorted(self.results, key=template_sort_key)
+            results = dict(self.results)
+        included_by = defaultdict(int)
+        for key in keys:
+            for nested_key in self.nested(key):
+                included_by[nested_key] += 1
+        heights = {}
+        cycles = []
+        for component in strongly_connected_components(keys, self.nested):
+            if len(component) > 1 or component[0] in self.nested(component[0]):
+                cycles.append(sorted(template_label(member) for member in component))
+                heights.update((member, None) for member in component)
+                continue
+            nested = self.nested(component[0])
+            heights[component[0]] = None if any(heights.get(nested_key) is None for nested_key in nested) else max((heights[nested_key] + 1 for nested_key in nested), default=0)
+        templates = []
+        for key in keys:
+            result = results[key]
+            templates.append({
+                'template': template_label(key),
+                'key': list(key),
+                'type': result['type'],
+                'ci_stages': result['ci_stages'],
+                'infra': sorted(result['infra']),
+                'nested': [template_label(nested_key) for nested_key in self.nested(key)],
+                'included_by': included_by[key],
+                'height': heights.get(key),
+                'error': result['error']
+            })
+        return {
+            'templates': templates,
+            'edges': sum(len(template['nested']) for template in templates),
+            'max_height': max((height for height in heights.values() if height is not None), default=0),
+            'max_fan_out': max((len(template['nested']) for template in templates), default=0),
+            'max_fan_in': max(included_by.values(), default=0),
+            'cycles': cycles,
+            'missing': [template['template'] for template in templates if template['error'] and template['error'] != 'Template cycle']
+        }
 
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+    def write_graph(self, path):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as graph_file:
+            json.dump(self.graph(), graph_file, indent=2)
+        os.replace(temp_path, path)
+
+    def _analyze(self, key, template_yaml, error, parent_pipeline_id):
+        scope, org_identifier, project_identifier, template_id, _ = key
+        if not template_yaml:
+            with self.lock:
+                self.stats['errors'] += 1
+            return {'type': None, 'ci_stages': 0, 'infra': frozenset(), 'templates_used': frozenset(), 'error': error or f'Empty template {template_id}'}
         if parent_pipeline_id == DEBUG_PIPELINE_NAME and DEBUG == True:
-            template_yaml = yaml.safe_load(response.json()['data']['yaml'])
-            logging.info(f'Template YAML fetched for {template_ref}: {template_yaml}')
-        return yaml.safe_load(response.json()['data']['yaml']), None
-    except requests.exceptions.HTTPError as e:
-        logging.error(f'Error fetching template YAML: {e}\nURL: {url}\nResponse: {response.text}')
-        return None, str(e)
-    except requests.exceptions.ConnectionError as e:
-        logging.error(f'Connection error: {e}\nURL: {url}')
-        return None, str(e)
-
-def process_stages(stages, processed_templates, template_count, current_level='project', org_identifier=None, project_identifier=None, parent_pipeline_id=None):
+            logging.info(f'Fetched template YAML for {key}: {json.dumps(template_yaml, indent=2)}')
+        template = template_yaml.get('template', {})
+        spec = template.get('spec', {})
+        infra_types, ci_stages, _, templates_used = process_stages(spec.get('stages', []), self, {}, scope, org_identifier, project_identifier, parent_pipeline_id)
+        if template.get('type') == 'Stage' and spec.get('type') == 'CI':
+            ci_stages += 1
+            infrastructure = spec.get('infrastructure', {'type': 'Harness Cloud'})
+            infra_types.add(infrastructure.get('type', 'Harness Cloud'))
+        logging.info(f'Resolved template {key}: {ci_stages} CI stage(s), infra {sorted(infra_types)}')
+        return {'type': template.get('type'), 'ci_stages': ci_stages, 'infra': frozenset(infra_types), 'templates_used': frozenset(templates_used), 'error': None}
+
+# End template resolution
+
+def process_stages(stages, templates, template_count, current_level='project', org_identifier=None, project_identifier=None, parent_pipeline_id=None):
     infra_types = set()
     ci_stage_count = 0
     has_template = False
@@ -173,42 +1272,14 @@ def process_stages(stages, processed_templates, template_count, current_level='p
                 logging.info(f'Stage data: {json.dumps(stage_data, indent=2)}')
             if 'template' in stage_data and 'templateRef' in stage_data['template']:
                 template_ref = stage_data['template']['templateRef']
-                version_label = stage_data['template'].get('versionLabel', '0.0.1')
+                version_label = stage_data['template'].get('versionLabel')
                 templates_used.add(template_ref)
-                if template_ref not in processed_templates:
-                    processed_templates[template_ref] = {'count': 0, 'type': None, 'ci': False, 'infra': set()}
-                    template_yaml, error = get_template_yaml(template_ref, current_level=current_level, org_identifier=org_identifier, project_identifier=project_identifier, version_label=version_label, parent_pipeline_id=parent_pipeline_id)
-                    if template_yaml:
-                        processed_templates[template_ref]['count'] += 1
-                        logging.info(f'Incremented template count for {template_ref}: {processed_templates[template_ref]["count"]}')
-                        template_level = current_level
-                        if template_ref.startswith('account.'):
-                            template_level = 'account'
-                        elif template_ref.startswith('org.'):
-                            template_level = 'org'
-                        if parent_pipeline_id == DEBUG_PIPELINE_NAME and DEBUG == True:
-                            logging.info(f'Fetched template YAML for {template_ref}: {json.dumps(template_yaml, indent=2)}')
-                        infra_types_pipeline, ci_stages_count, has_template_stage, templates_used_recursive = process_stages(
-                            template_yaml.get('template', {}).get('spec', {}).get('stages', []), processed_templates, template_count, template_level, org_identifier, project_identifier, parent_pipeline_id
-                        )
-                        infra_types.update(infra_types_pipeline)
-                        processed_templates[template_ref]['infra'].update(infra_types_pipeline)
-                        ci_stage_count += ci_stages_count
-                        has_template = has_template or has_template_stage
-                        templates_used.update(templates_used_recursive)
-                    if template_yaml and template_yaml.get('template', {}).get('type') == 'Stage':
-                        if template_yaml.get('template', {}).get('spec', {}).get('type') == 'CI':
-                            logging.info(f'Identified CI stage from template: {stage_data["name"]}')
-                            processed_templates[template_ref]['ci'] = True
-                            ci_stage_count += 1
-                            infrastructure = template_yaml.get('template', {}).get('spec', {}).get('infrastructure', {'type': 'Harness Cloud'})
-                            infra_type = infrastructure.get('type', 'Harness Cloud')
-                            infra_types.add(infra_type)
-                            processed_templates[template_ref]['infra'].add(infra_type)
-                else:
-                    if processed_templates[template_ref]['ci']:
-                        ci_stage_count += 1
-                        infra_types.update(processed_templates[template_ref]['infra'])
+                template = templates.resolve(template_key(template_ref, version_label, current_level, org_identifier, project_identifier), parent_pipeline_id)
+                if template['ci_stages']:
+                    logging.info(f'Identified {template["ci_stages"]} CI stage(s) from template: {stage_data["name"]}')
+                ci_stage_count += template['ci_stages']
+                infra_types.update(template['infra'])
+                templates_used.update(template['templates_used'])
             if stage_data.get('type') == 'CI' or stage_data.get('templateInputs', {}).get('type') == 'CI':
                 logging.info(f'Identified CI stage: {stage_data["name"]}')
                 ci_stage_count += 1
@@ -220,137 +1291,287 @@ def process_stages(stages, processed_templates, template_count, current_level='p
             if parent_pipeline_id == DEBUG_PIPELINE_NAME and DEBUG == True:
                 logging.info('Processing parallel stages')
             parallel_infra_types, parallel_ci_stage_count, parallel_has_template, templates_used_parallel = process_stages(
-                stage['parallel'], processed_templates, template_count, current_level, org_identifier, project_identifier, parent_pipeline_id
+                stage['parallel'], templates, template_count, current_level, org_identifier, project_identifier, parent_pipeline_id
             )
             infra_types.update(parallel_infra_types)
             ci_stage_count += parallel_ci_stage_count
             has_template = has_template or parallel_has_template
             templates_used.update(templates_used_parallel)
 
-    if len(infra_types) > 1:
-        infra_types = {'Mixed'}
-
+    # Every infrastructure type is kept; handle_infra_types counts a pipeline with several as Mixed
     return infra_types, ci_stage_count, has_template, templates_used
 
-def analyze_pipelines(pipelines, org_identifier, project_identifier, processed_templates, template_count):
-    ci_stage_count = 0
-    total_ci_stages = 0
-    total_pipelines_with_ci = 0
-    infra_types = defaultdict(int)
-    pipeline_details = []
-    pipeline_errors = []
-    total_pipelines = len(pipelines)
-    avg_build_times = []
-    max_build_times = []
-
-    for pipeline in pipelines:
-        store_type = pipeline.get('storeType', 'INLINE')
-        connector_ref = pipeline.get('connectorRef')
-        repo_name = pipeline.get('repoName')
+class PipelineRecord:
+    # Everything one pipeline contributes to the project summary, so summaries can be rebuilt
+    # from stored records without re-analyzing unchanged pipelines. Identifiers, infrastructure
+    # types and template references are interned and kept as tuples; the detail and error rows
+    # and the JSON form (the pipeline state and journal format) are only built when written.
+    __slots__ = ('org_identifier', 'project_identifier', 'pipeline_identifier', 'pipeline_name', 'last_updated_at',
+                 'ci_stages', 'infra_types', 'stage_infra_types', 'build_times', 'templates', 'direct_templates',
+                 'analyzed', 'total_stages', 'template_count', 'templates_used', 'error')
+
+    def __init__(self, org_identifier, project_identifier, pipeline_identifier, pipeline_name='', last_updated_at=None):
+        self.org_identifier = sys.intern(org_identifier)
+        self.project_identifier = sys.intern(project_identifier)
+        self.pipeline_identifier = sys.intern(pipeline_identifier)
+        self.pipeline_name = pipeline_name
+        self.last_updated_at = last_updated_at
+        self.ci_stages = 0
+        # infra_types counts a pipeline with several infrastructure types as Mixed; stage_infra_types
+        # keeps all of them
+        self.infra_types = ()
+        self.stage_infra_types = ()
+        self.build_times = None
+        # ((scope, org, project, identifier, versionLabel), fingerprint) of every template used, and
+        # the keys of those referenced by the pipeline itself rather than by another template
+        self.templates = ()
+        self.direct_templates = ()
+        # analyzed: the pipeline has a detail row (total_stages, template_count, templates_used)
+        self.analyzed = False
+        self.total_stages = None
+        self.template_count = 0
+        self.templates_used = ()
+        self.error = None
+
+    @classmethod
+    def for_pipeline(cls, org_identifier, project_identifier, pipeline):
+        return cls(org_identifier, project_identifier, pipeline['identifier'], pipeline.get('name', ''), pipeline.get('lastUpdatedAt'))
+
+    @property
+    def pipelines_with_ci(self):
+        return 1 if self.ci_stages > 0 else 0
+
+    def copy(self, **changes):
+        record = PipelineRecord.__new__(PipelineRecord)
+        for field in self.__slots__:
+            setattr(record, field, changes[field] if field in changes else getattr(self, field))
+        return record
+
+    def set_detail(self, total_stages, template_count, templates_used):
+        self.analyzed = True
+        self.total_stages = total_stages
+        self.template_count = template_count
+        self.templates_used = tuple(sys.intern(template_ref) for template_ref in templates_used)
+
+    def detail_row(self):
+        if not self.analyzed:
+            return None
+        row = {
+            'pipeline_identifier': self.pipeline_identifier,
+            'org_identifier': self.org_identifier,
+            'project_identifier': self.project_identifier,
+            'ci_stages_count': self.ci_stages,
+            'infra_types': ', '.join(self.infra_types),
+            'total_stages': self.total_stages,
+            'template_count': self.template_count,
+            'pipeline_name': self.pipeline_name,
+            'templates_used': ', '.join(self.templates_used)
+        }
+        if self.build_times is not None:
+            row.update(self.build_times.fields())
+        return row
+
+    def error_row(self):
+        if self.error is None:
+            return None
+        return {
+            'org_identifier': self.org_identifier,
+            'project_identifier': self.project_identifier,
+            'pipeline_identifier': self.pipeline_identifier,
+            'error': self.error
+        }
 
-        pipeline_identifier = pipeline['identifier']
-        if pipeline_identifier != DEBUG_PIPELINE_NAME and DEBUG == True:
-            continue
+    def to_dict(self):
+        has_build_times = self.build_times is not None
+        return {
+            'org_identifier': self.org_identifier,
+            'project_identifier': self.project_identifier,
+            'pipeline_identifier': self.pipeline_identifier,
+            'last_updated_at': self.last_updated_at,
+            'pipelines_with_ci': self.pipelines_with_ci,
+            'ci_stages': self.ci_stages,
+            'infra_types': {infra_type: 1 for infra_type in self.infra_types},
+            'stage_infra_types': list(self.stage_infra_types),
+            'avg_build_time': self.build_times.mean if has_build_times else 0,
+            'max_build_time': self.build_times.max if has_build_times else 0,
+            'has_build_times': has_build_times,
+            'build_time_stats': self.build_times.to_dict() if has_build_times else None,
+            'templates': [{'key': list(key), 'fingerprint': fingerprint, 'direct': key in self.direct_templates} for key, fingerprint in self.templates],
+            'detail': self.detail_row(),
+            'error': self.error_row()
+        }
 
-        pipeline_yaml, error = get_pipeline_yaml(org_identifier, project_identifier, pipeline_identifier, store_type, connector_ref, repo_name)
-        if error:
-            pipeline_errors.append({
-                'org_identifier': org_identifier,
-                'project_identifier': project_identifier,
-                'pipeline_identifier': pipeline_identifier,
-                'error': error
-            })
-            logging.error(f'Error fetching pipeline YAML: {error} for pipeline {pipeline_identifier}')
+    @classmethod
+    def from_dict(cls, data):
+        detail = data.get('detail')
+        record = cls(data['org_identifier'], data['project_identifier'], data['pipeline_identifier'], (detail or {}).get('pipeline_name', ''), data.get('last_updated_at'))
+        record.ci_stages = data['ci_stages']
+        record.infra_types = tuple(sys.intern(infra_type) for infra_type in data['infra_types'])
+        # States written before stage_infra_types only have the Mixed-collapsed types
+        record.stage_infra_types = tuple(sys.intern(infra_type) for infra_type in data.get('stage_infra_types', record.infra_types))
+        if data.get('has_build_times'):
+            record.build_times = BuildTimeStats.from_dict(data.get('build_time_stats'))
+        record.templates = tuple((template_key_from_list(template['key']), template['fingerprint']) for template in data.get('templates', []))
+        record.direct_templates = tuple(key for (key, _), template in zip(record.templates, data.get('templates', [])) if template.get('direct'))
+        if detail:
+            templates_used = detail.get('templates_used') or ''
+            # States written by earlier pre-filtered runs have '' for an unknown stage count
+            total_stages = detail.get('total_stages')
+            record.set_detail(None if total_stages == '' else total_stages, detail.get('template_count', 0), templates_used.split(', ') if templates_used else ())
+        if data.get('error'):
+            record.error = data['error']['error']
+        return record
+
+def template_key_from_list(key):
+    return tuple(sys.intern(part) if isinstance(part, str) else part for part in key)
+
+def is_non_ci_pipeline(pipeline):
+    # 'pms' is the pipeline service itself and says nothing about the stages
+    modules = pipeline.get('modules')
+    if not isinstance(modules, list):
+        return False
+    modules = {str(module).lower() for module in modules} - {'pms'}
+    return bool(modules) and 'ci' not in modules
+
+def add_build_times(record, build_times):
+    record.build_times = build_times
+
+def add_stage_results(record, ci_stages_count, infra_types_pipeline):
+    record.stage_infra_types = tuple(sorted(sys.intern(infra_type) for infra_type in infra_types_pipeline))
+    record.infra_types += tuple(sys.intern(infra_type) for infra_type in handle_infra_types(infra_types_pipeline))
+    record.ci_stages += ci_stages_count
+
+def template_fingerprint(template_yaml):
+    if not template_yaml:
+        return None
+    return hashlib.sha1(json.dumps(template_yaml, sort_keys=True, default=str).encode()).hexdigest()
+
+def record_templates(record, keys, templates):
+    # Remember every template the pipeline depends on, directly or through nested templates,
+    # with a fingerprint of its content
+    record.direct_templates = tuple(template_key_from_list(key) for key in keys)
+    pending = list(keys)
+    seen = set()
+    while pending:
+        key = pending.pop()
+        if key in seen:
             continue
-
-        if pipeline_yaml:
-            if pipeline_identifier == DEBUG_PIPELINE_NAME and DEBUG == True:
-                logging.info(f'Pipeline YAML for {pipeline_identifier}: {json.dumps(pipeline_yaml, indent=2)}')
-            current_level = 'project' if project_identifier else 'org' if org_identifier else 'account'
-            if 'template' in pipeline_yaml.get('pipeline', {}) and 'templateRef' in pipeline_yaml['pipeline']['template']:
-                template_ref = pipeline_yaml['pipeline']['template']['templateRef']
-                if template_ref not in processed_templates:
-                    processed_templates[template_ref] = {'count': 0, 'type': None, 'ci': False, 'infra': set()}
-                    template_yaml, error = get_template_yaml(template_ref, current_level=current_level, org_identifier=org_identifier, project_identifier=project_identifier, parent_pipeline_id=pipeline_identifier)
-                    if template_yaml:
-                        if pipeline_identifier == DEBUG_PIPELINE_NAME and DEBUG == True:
-                            logging.info(f'Template YAML for {template_ref}: {json.dumps(template_yaml, indent=2)}')
-                        processed_templates[template_ref]['count'] += 1
-                        logging.info(f'Incremented template count for {template_ref}: {processed_templates[template_ref]["count"]}')
-                        template_level = 'account' if template_ref.startswith('account.') else 'org' if template_ref.startswith('org.') else 'project'
-                        infra_types_pipeline, ci_stages_count, has_template_stage, templates_used_recursive = process_stages(
-                            template_yaml.get('template', {}).get('spec', {}).get('stages', []), processed_templates, template_count, template_level, org_identifier, project_identifier, parent_pipeline_id=pipeline_identifier
-                        )
-                        infra_types_pipeline = handle_infra_types(infra_types_pipeline)
-                        for infra_type in infra_types_pipeline:
-                            infra_types[infra_type] += 1
-                        total_ci_stages += ci_stages_count
-                        if ci_stages_count > 0:
-                            ci_stage_count += 1
-                            total_pipelines_with_ci += 1
-                        if pipeline_identifier == DEBUG_PIPELINE_NAME and DEBUG == True:
-                            logging.info(f'Pipeline details after template processing: {pipeline_details}')
-                            logging.info(f'Infra types after template processing: {infra_types}')
-                        pipeline_details.append({
-                            'pipeline_identifier': pipeline_identifier,
-                            'org_identifier': org_identifier,
-                            'project_identifier': project_identifier,
-                            'ci_stages_count': ci_stages_count,
-                            'infra_types': ', '.join(infra_types_pipeline),
-                            'total_stages': len(pipeline_yaml.get('pipeline', {}).get('stages', [])),
-                            'template_count': sum(template_count.values()),
-                            'pipeline_name': pipeline.get('name', ''),
-                            'templates_used': ', '.join(templates_used_recursive)
-                        })
-                        continue
-                else:
-                    processed_templates[template_ref]['count'] += 1
-                    infra_types_pipeline = processed_templates[template_ref]['infra']
-                    ci_stages_count = 1 if processed_templates[template_ref]['ci'] else 0
-
-                    for infra_type in infra_types_pipeline:
-                        infra_types[infra_type] += 1
-                    total_ci_stages += ci_stages_count
-                    if ci_stages_count > 0:
-                        ci_stage_count += 1
-                        total_pipelines_with_ci += 1
-
-            templates_used_recursive = set()
+        seen.add(key)
+        record.templates += ((template_key_from_list(key), templates.fingerprint(key)),)
+        pending.extend(templates.nested(key))
+
+def analyze_pipeline(pipeline, org_identifier, project_identifier, templates, template_count, engine=None):
+    fetch_pipeline_yaml = engine.get_pipeline_yaml if engine else get_pipeline_yaml
+    fetch_build_times = engine.get_build_time_stats if engine else get_build_time_stats
+    record = PipelineRecord.for_pipeline(org_identifier, project_identifier, pipeline)
+
+    store_type = pipeline.get('storeType', 'INLINE')
+    connector_ref = pipeline.get('connectorRef')
+    repo_name = pipeline.get('repoName')
+
+    pipeline_identifier = pipeline['identifier']
+    if pipeline_identifier != DEBUG_PIPELINE_NAME and DEBUG == True:
+        return record
+
+    if PREFILTER_NON_CI and is_non_ci_pipeline(pipeline):
+        logging.info(f'Skipping non-CI pipeline {pipeline_identifier} (modules: {pipeline["modules"]})')
+        metrics.count('pipelines_prefiltered_total')
+        record.set_detail(pipeline.get('stageCount'), sum(template_count.values()), ())
+        return record
+
+    pipeline_yaml, error = fetch_pipeline_yaml(org_identifier, project_identifier, pipeline_identifier, store_type, connector_ref, repo_name, pipeline.get('lastUpdatedAt'))
+    if error:
+        record.error = error
+        logging.error(f'Error fetching pipeline YAML: {error} for pipeline {pipeline_identifier}')
+        return record
+
+    if pipeline_yaml:
+        if pipeline_identifier == DEBUG_PIPELINE_NAME and DEBUG == True:
+            logging.info(f'Pipeline YAML for {pipeline_identifier}: {json.dumps(pipeline_yaml, indent=2)}')
+        current_level = 'project' if project_identifier else 'org' if org_identifier else 'account'
+        if 'template' in pipeline_yaml.get('pipeline', {}) and 'templateRef' in pipeline_yaml['pipeline']['template']:
+            pipeline_template = pipeline_yaml['pipeline']['template']
+            template_ref = pipeline_template['templateRef']
+            template = templates.resolve(template_key(template_ref, pipeline_template.get('versionLabel'), current_level, org_identifier, project_identifier), pipeline_identifier)
+            if not template['error']:
+                ci_stages_count = template['ci_stages']
+                add_stage_results(record, ci_stages_count, template['infra'])
+                if pipeline_identifier == DEBUG_PIPELINE_NAME and DEBUG == True:
+                    logging.info(f'Pipeline record after template processing: {record}')
+                build_times = fetch_build_times(org_identifier, project_identifier, pipeline_identifier)
+                record.set_detail(len(pipeline_yaml.get('pipeline', {}).get('stages', [])), sum(template_count.values()), template['templates_used'])
+                add_build_times(record, build_times)
+                return record
+
+        templates_used_recursive = set()
+        with metrics.timer('phase_seconds', phase='process_stages'):
             infra_types_pipeline, ci_stages_count, has_template_stage, templates_used_recursive = process_stages(
-                pipeline_yaml.get('pipeline', {}).get('stages', []), processed_templates, template_count, current_level, org_identifier, project_identifier, parent_pipeline_id=pipeline_identifier
+                pipeline_yaml.get('pipeline', {}).get('stages', []), templates, template_count, current_level, org_identifier, project_identifier, parent_pipeline_id=pipeline_identifier
             )
-            infra_types_pipeline = handle_infra_types(infra_types_pipeline)
-            for infra_type in infra_types_pipeline:
-                infra_types[infra_type] += 1
-            total_ci_stages += ci_stages_count
-            if ci_stages_count > 0:
-                ci_stage_count += 1
-                total_pipelines_with_ci += 1
-            if pipeline_identifier == DEBUG_PIPELINE_NAME and DEBUG == True:
-                logging.info(f'Pipeline details after stage processing: {pipeline_details}')
-                logging.info(f'Infra types after stage processing: {infra_types}')
-            avg_build_time, max_build_time = get_avg_and_max_build_time(org_identifier, project_identifier, pipeline_identifier)
-            if avg_build_time > 0 and max_build_time > 0:
-                avg_build_times.append(avg_build_time)
-                max_build_times.append(max_build_time)
-            pipeline_details.append({
-                'pipeline_identifier': pipeline_identifier,
-                'org_identifier': org_identifier,
-                'project_identifier': project_identifier,
-                'ci_stages_count': ci_stages_count,
-                'infra_types': ', '.join(infra_types_pipeline),
-                'total_stages': len(pipeline_yaml.get('pipeline', {}).get('stages', [])),
-                'template_count': sum(template_count.values()),
-                'pipeline_name': pipeline.get('name', ''),
-                'templates_used': ', '.join(templates_used_recursive),
-                'avg_build_time': avg_build_time,
-                'max_build_time': max_build_time
-            })
-
-    total_avg_build_time = sum(avg_build_times) / len(avg_build_times) if avg_build_times else 0
-    total_max_build_time = max(max_build_times) if max_build_times else 0
-
-    return total_pipelines, total_pipelines_with_ci, total_ci_stages, infra_types, template_count, pipeline_details, pipeline_errors, total_avg_build_time, total_max_build_time
+        add_stage_results(record, ci_stages_count, infra_types_pipeline)
+        if pipeline_identifier == DEBUG_PIPELINE_NAME and DEBUG == True:
+            logging.info(f'Pipeline record after stage processing: {record}')
+        build_times = fetch_build_times(org_identifier, project_identifier, pipeline_identifier)
+        record.set_detail(len(pipeline_yaml.get('pipeline', {}).get('stages', [])), sum(template_count.values()), templates_used_recursive)
+        add_build_times(record, build_times)
+    return record
+
+def analyze_project(pipelines, org_identifier, project_identifier, templates, template_count, engine=None, incremental=None, journal=None):
+    # Yields the per-pipeline records of one project as each pipeline is analyzed. In incremental
+    # mode, records of pipelines that did not change since the previous run are reused and only
+    # their build times are refreshed. Pipelines already in the journal of a resumed run are taken
+    # from it as they are.
+    fetch_build_times = engine.get_build_time_stats if engine else get_build_time_stats
+    for pipeline in pipelines:
+        if engine:
+            engine.consume(org_identifier, project_identifier, pipeline['identifier'])
+        journaled = journal.pipeline_record(org_identifier, project_identifier, pipeline['identifier']) if journal else None
+        if journaled:
+            journal.stats['resumed_pipelines'] += 1
+            yield journaled
+            continue
+        previous = incremental.reusable_record(org_identifier, project_identifier, pipeline) if incremental else None
+        with metrics.span(org_identifier, project_identifier, pipeline['identifier']):
+            if previous:
+                record = previous.copy(pipeline_name=pipeline.get('name', ''))
+                if record.build_times is not None:
+                    add_build_times(record, fetch_build_times(org_identifier, project_identifier, pipeline['identifier']))
+            else:
+                with templates.track() as template_keys:
+                    record = analyze_pipeline(pipeline, org_identifier, project_identifier, templates, template_count, engine=engine)
+                record_templates(record, template_keys, templates)
+        metrics.count('pipelines_total', result='reused' if previous else 'error' if record.error else 'analyzed')
+        if journal:
+            journal.add_pipeline(record)
+        yield record
+
+def summarize_pipeline_records(records):
+    total_ci_stages = 0
+    total_pipelines_with_ci = 0
+    infra_types = defaultdict(int)
+    pipeline_details = []
+    pipeline_errors = []
+    total_pipelines = 0
+    build_times = BuildTimeStats()
+
+    for record in records:
+        total_pipelines += 1
+        total_pipelines_with_ci += record.pipelines_with_ci
+        total_ci_stages += record.ci_stages
+        for infra_type in record.infra_types:
+            infra_types[infra_type] += 1
+        build_times.merge(record.build_times)
+        if record.analyzed:
+            pipeline_details.append(record.detail_row())
+        if record.error is not None:
+            pipeline_errors.append(record.error_row())
+
+    return total_pipelines, total_pipelines_with_ci, total_ci_stages, infra_types, pipeline_details, pipeline_errors, build_times
+
+def analyze_pipelines(pipelines, org_identifier, project_identifier, templates, template_count, engine=None):
+    records = list(analyze_project(pipelines, org_identifier, project_identifier, templates, template_count, engine=engine))
+    total_pipelines, total_pipelines_with_ci, total_ci_stages, infra_types, pipeline_details, pipeline_errors, build_times = summarize_pipeline_records(records)
+    return total_pipelines, total_pipelines_with_ci, total_ci_stages, infra_types, template_count, pipeline_details, pipeline_errors, build_times.mean, build_times.max
 
 def handle_infra_types(infra_types_pipeline):
     if len(infra_types_pipeline) > 1:
@@ -374,73 +1595,900 @@ def calculate_percentage(infra_types, total_count):
 
 # Calculate Build time avg and max of pipelines
 
-@tenacity.retry(
-    stop=tenacity.stop_after_attempt(3),
-    wait=tenacity.wait_fixed(5),
-    retry=tenacity.retry_if_exception_type(requests.exceptions.RequestException),
-    reraise=True
-)
-def fetch_pipeline_executions(org_identifier, project_identifier, pipeline_identifier):
-    api_url = f'https://app.harness.io/pipeline/api/pipelines/execution/summary?accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&projectIdentifier={project_identifier}&pipelineIdentifier={pipeline_identifier}&page=0&size=20&showAllExecutions=true&getDefaultFromOtherRepo=true'
+@timer_func
+@retry_transient_errors
+def fetch_pipeline_executions(org_identifier, project_identifier, pipeline_identifier, page=0, page_size=EXECUTION_PAGE_SIZE, start_time=None):
+    client = get_http_client()
+    api_url = f'{client.base_url}/pipeline/api/pipelines/execution/summary?accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&projectIdentifier={project_identifier}&pipelineIdentifier={pipeline_identifier}&page={page}&size={page_size}&showAllExecutions=true&getDefaultFromOtherRepo=true'
     print(f'Fetching pipeline executions for pipeline {pipeline_identifier}: {api_url}')
     
     payload = {
         "filterType": "PipelineExecution"
     }
-    response = requests.post(api_url, headers=headers, json=payload)
+    if start_time:
+        payload['timeRange'] = {'startTime': start_time, 'endTime': int(time.time() * 1000)}
+    response = client.post(api_url, json=payload, endpoint='executions')
     response.raise_for_status()  # Raise an exception for HTTP errors
     return response.json()
 
-def safe_fetch_pipeline_executions(org_identifier, project_identifier, pipeline_identifier):
+def safe_fetch_pipeline_executions(org_identifier, project_identifier, pipeline_identifier, page=0, page_size=EXECUTION_PAGE_SIZE, start_time=None):
     try:
-        return fetch_pipeline_executions(org_identifier, project_identifier, pipeline_identifier)
+        return fetch_pipeline_executions(org_identifier, project_identifier, pipeline_identifier, page, page_size, start_time)
     except requests.exceptions.RequestException as e:
         logging.error(f'Failed to fetch pipeline executions for {pipeline_identifier}: {e}')
         return None
 
+def iter_pipeline_executions(org_identifier, project_identifier, pipeline_identifier, page_size=EXECUTION_PAGE_SIZE, max_pages=EXECUTION_MAX_PAGES, start_time=None):
+    def fetch_page(page):
+        response_data = safe_fetch_pipeline_executions(org_identifier, project_identifier, pipeline_identifier, page, page_size, start_time)
+        return response_data.get('data') if response_data else None
+    for execution in iter_pages(fetch_page, page_size, max_pages):
+        if start_time and execution.get('startTs', start_time) < start_time:
+            continue
+        yield execution
+
+
+def ci_build_time(execution):
+    # Minutes spent in the execution's CI nodes
+    build_time = 0
+    for node in execution.get('layoutNodeMap', {}).values():
+        if node['nodeType'] == 'CI' and 'startTs' in node and 'endTs' in node:
+            build_time += (node['endTs'] - node['startTs']) / 1000 / 60 
+    return build_time
 
 def calculate_build_times(executions):
+    # BuildTimeStats of the executions' CI time
     print("Calculating Executions Build Times")
+    return build_time_stats([ci_build_time(execution) for execution in executions])
+
+class BuildTimeStats:
+    # Mergeable summary of CI build times in minutes: exact count, sum, min and max, plus a
+    # log-bucketed histogram where every bucket is within 1% of the values in it, for percentiles.
+    # The sum is kept in integer milliseconds (build times come from millisecond timestamps), so
+    # merging is exact and associative: pipeline stats roll up to projects, orgs and the account,
+    # and shards merge, to the same figures in any order.
+    __slots__ = ('count', 'total_ms', 'min', 'max', 'buckets')
+    relative_accuracy = 0.01
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    log_gamma = math.log(gamma)
+
+    def __init__(self, build_times=()):
+        self.count = 0
+        self.total_ms = 0
+        self.min = 0
+        self.max = 0
+        self.buckets = defaultdict(int)
+        self.add(build_times)
+
+    def add(self, build_times):
+        # Executions that spent no time in CI nodes are not build times
+        build_times = [build_time for build_time in build_times if build_time > 0]
+        if not build_times:
+            return self
+        self.min = min(build_times) if not self.count else min(self.min, min(build_times))
+        self.max = max(self.max, max(build_times))
+        self.count += len(build_times)
+        self.total_ms += sum(round(build_time * 60000) for build_time in build_times)
+        for build_time in build_times:
+            self.buckets[math.ceil(math.log(build_time) / self.log_gamma)] += 1
+        return self
+
+    def merge(self, other):
+        if not other or not other.count:
+            return self
+        self.min = other.min if not self.count else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total_ms += other.total_ms
+        for index, count in other.buckets.items():
+            self.buckets[index] += count
+        return self
+
+    @property
+    def mean(self):
+        return self.total_ms / (60000 * self.count) if self.count else 0
+
+    def quantile(self, q):
+        if not self.count:
+            return 0
+        # Nearest rank: the smallest build time with at least q of all build times at or below it
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(max(2 * self.gamma ** index / (self.gamma + 1), self.min), self.max)
+        return self.max
+
+    def fields(self):
+        return {
+            'avg_build_time': self.mean,
+            'max_build_time': self.max,
+            'p50_build_time': self.quantile(0.5),
+            'p90_build_time': self.quantile(0.9),
+            'p99_build_time': self.quantile(0.99)
+        }
 
-    if not executions:
+    def to_dict(self):
+        return {'count': self.count, 'total_ms': self.total_ms, 'min': self.min, 'max': self.max, 'buckets': {str(index): count for index, count in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        if data:
+            stats.count, stats.min, stats.max = data['count'], data['min'], data['max']
+            # States and shard partials written before total_ms kept the sum in float minutes
+            stats.total_ms = data['total_ms'] if 'total_ms' in data else round(data['total'] * 60000)
+            for index, count in data['buckets'].items():
+                stats.buckets[int(index)] = count
+        return stats
+
+def build_time_stats(build_times):
+    if not build_times:
         print("No Executions")
-        return 0, 0
-    
-    total_time = []
-    
-    for execution in executions:
-        build_time = 0
-        for node in execution.get('layoutNodeMap', {}).values():
-            if node['nodeType'] == 'CI' and 'startTs' in node and 'endTs' in node:
-                build_time += (node['endTs'] - node['startTs']) / 1000 / 60 
-        
-        if build_time > 0:
-            total_time.append(build_time)
-    
-    if not total_time:
-        return 0, 0
-    
-    avg_time = sum(total_time) / len(total_time)
-    max_time = max(total_time)
+        return BuildTimeStats()
+    stats = BuildTimeStats(build_times)
+    if stats.count:
+        print(f"Avg/Max time: {stats.mean}/{stats.max}")
+    return stats
+
+FINISHED_STATUSES = {'Success', 'Failed', 'Aborted', 'Expired', 'Errored', 'IgnoreFailed', 'ApprovalRejected', 'Skipped'}
+
+def is_finished(execution):
+    return execution.get('status') in FINISHED_STATUSES and execution.get('planExecutionId') is not None
+
+class ExecutionCache:
+    # Finished executions never change, so only their CI build time is kept, keyed by
+    # planExecutionId. A watermark per pipeline (or per project in project mode) records from which
+    # start time the next run has to ask again: the newest finished execution, or the oldest one
+    # that was still running.
+    def __init__(self, path=EXECUTION_CACHE_PATH):
+        self.lock = threading.Lock()
+        self.stats = {'fetched': 0, 'stored': 0, 'from_cache': 0}
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS executions (
+                plan_execution_id TEXT PRIMARY KEY,
+                account_identifier TEXT,
+                org_identifier TEXT NOT NULL,
+                project_identifier TEXT NOT NULL,
+                pipeline_identifier TEXT NOT NULL,
+                status TEXT,
+                start_ts INTEGER,
+                end_ts INTEGER,
+                build_time REAL NOT NULL
+            )''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS executions_pipeline ON executions (account_identifier, org_identifier, project_identifier, pipeline_identifier, start_ts)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS execution_watermarks (scope TEXT PRIMARY KEY, since_ts INTEGER)')
+
+    def since(self, scope):
+        with self.lock:
+            row = self.connection.execute('SELECT since_ts FROM execution_watermarks WHERE scope = ?', ('\x1f'.join(scope),)).fetchone()
+        return row[0] if row else None
+
+    def store(self, org_identifier, project_identifier, executions, scope):
+        # Only a pipeline-scope listing says which pipeline an execution without pipelineIdentifier
+        # belongs to; anything else is skipped rather than filed under the project's identifier
+        pipeline_identifier = scope[-1] if scope[0] == 'pipeline' else None
+        finished = []
+        for execution in executions:
+            if not is_finished(execution):
+                continue
+            if not (execution.get('pipelineIdentifier') or pipeline_identifier):
+                logging.warning(f'Not caching execution {execution.get("planExecutionId")} without a pipelineIdentifier')
+                continue
+            finished.append(execution)
+        running_starts = [execution['startTs'] for execution in executions if not is_finished(execution) and 'startTs' in execution]
+        finished_starts = [execution['startTs'] for execution in finished if 'startTs' in execution]
+        with self.lock:
+            self.stats['fetched'] += len(executions)
+            self.stats['stored'] += len(finished)
+            self.connection.execute('BEGIN')
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO executions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(execution['planExecutionId'], HARNESS_ACCOUNT_ID, org_identifier, project_identifier, execution.get('pipelineIdentifier') or pipeline_identifier,
+                  execution.get('status'), execution.get('startTs'), execution.get('endTs'), ci_build_time(execution)) for execution in finished]
+            )
+            if running_starts or finished_starts:
+                previous = self.connection.execute('SELECT since_ts FROM execution_watermarks WHERE scope = ?', ('\x1f'.join(scope),)).fetchone()
+                since = min(running_starts) if running_starts else max(finished_starts + ([previous[0]] if previous and previous[0] else []))
+                self.connection.execute('INSERT OR REPLACE INTO execution_watermarks VALUES (?, ?)', ('\x1f'.join(scope), since))
+            self.connection.execute('COMMIT')
+
+    def recent(self, org_identifier, project_identifier, pipeline_identifier=None, start_time=None, limit=None):
+        # (pipeline_identifier, plan_execution_id, status, start_ts, build_time), newest first
+        query = 'SELECT pipeline_identifier, plan_execution_id, status, start_ts, build_time FROM executions WHERE account_identifier IS ? AND org_identifier = ? AND project_identifier = ?'
+        params = [HARNESS_ACCOUNT_ID, org_identifier, project_identifier]
+        if pipeline_identifier is not None:
+            query += ' AND pipeline_identifier = ?'
+            params.append(pipeline_identifier)
+        if start_time:
+            query += ' AND start_ts >= ?'
+            params.append(start_time)
+        query += ' ORDER BY start_ts DESC'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+            self.stats['from_cache'] += len(rows)
+        return rows
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+_execution_cache = None
+
+def get_execution_cache():
+    global _execution_cache
+    if not EXECUTION_CACHE_PATH:
+        return None
+    with _http_client_lock:
+        if _execution_cache is None:
+            _execution_cache = ExecutionCache()
+        return _execution_cache
+
+def execution_row(execution, pipeline_identifier=None):
+    return (execution.get('pipelineIdentifier', pipeline_identifier), execution.get('planExecutionId'), execution.get('status'), execution.get('startTs') or 0, ci_build_time(execution))
+
+def merge_executions(fetched, cached_rows, limit=None):
+    # Newest first: executions fetched this run (running ones included) plus cached finished ones,
+    # as (pipeline_identifier, plan_execution_id, status, start_ts, build_time)
+    merged = [execution_row(execution) for execution in fetched]
+    seen = {row[1] for row in merged}
+    for row in cached_rows:
+        if row[1] not in seen:
+            merged.append(row[:3] + (row[3] or 0,) + row[4:])
+    merged.sort(key=lambda row: row[3], reverse=True)
+    return merged[:limit] if limit else merged
+
+def get_build_time_stats(org_identifier, project_identifier, pipeline_identifier):
+    if EXECUTION_FETCH_MODE == 'project':
+        return project_build_times.get(org_identifier, project_identifier, pipeline_identifier)
+    cache = get_execution_cache()
+    if not cache:
+        executions = list(iter_pipeline_executions(org_identifier, project_identifier, pipeline_identifier))
+        observe_executions(org_identifier, project_identifier, [execution_row(execution, pipeline_identifier) for execution in executions])
+        return calculate_build_times(executions)
+    # Only executions started since the watermark are fetched; older ones come from the cache
+    scope = ('pipeline', org_identifier, project_identifier, pipeline_identifier)
+    limit = EXECUTION_PAGE_SIZE * EXECUTION_MAX_PAGES if EXECUTION_MAX_PAGES else None
+    executions = [] if HARNESS_OFFLINE else list(iter_pipeline_executions(org_identifier, project_identifier, pipeline_identifier, start_time=cache.since(scope)))
+    cache.store(org_identifier, project_identifier, executions, scope)
+    merged = merge_executions(executions, cache.recent(org_identifier, project_identifier, pipeline_identifier, limit=limit), limit)
+    observe_executions(org_identifier, project_identifier, merged)
+    return build_time_stats([row[4] for row in merged])
 
-    # Ensure max_time is not less than avg_time
-    max_time = max(max_time, avg_time)
+@timer_func
+@retry_transient_errors
+def fetch_project_executions(org_identifier, project_identifier, page=0, page_size=EXECUTION_PROJECT_PAGE_SIZE, start_time=None):
+    client = get_http_client()
+    api_url = f'{client.base_url}/pipeline/api/pipelines/execution/summary?accountIdentifier={HARNESS_ACCOUNT_ID}&orgIdentifier={org_identifier}&projectIdentifier={project_identifier}&page={page}&size={page_size}&showAllExecutions=true&getDefaultFromOtherRepo=true'
+    print(f'Fetching executions for project {project_identifier}: {api_url}')
 
-    print(f"Avg/Max time: {avg_time}/{max_time}")
-    
-    return avg_time, max_time
+    payload = {
+        "filterType": "PipelineExecution"
+    }
+    if start_time:
+        payload['timeRange'] = {'startTime': start_time, 'endTime': int(time.time() * 1000)}
+    response = client.post(api_url, json=payload, endpoint='executions')
+    response.raise_for_status()
+    return response.json()
 
-def get_avg_and_max_build_time(org_identifier, project_identifier, pipeline_identifier):
-    response_data = safe_fetch_pipeline_executions(org_identifier, project_identifier, pipeline_identifier)
-    if response_data is None:
-        return 0, 0
-    executions = response_data.get('data', {}).get('content', [])
-    avg_time, max_time = calculate_build_times(executions)
-    return avg_time, max_time
+def execution_window_start(window_days=EXECUTION_WINDOW_DAYS):
+    return int((time.time() - window_days * 86400) * 1000) if window_days else None
+
+def iter_project_executions(org_identifier, project_identifier, page_size=EXECUTION_PROJECT_PAGE_SIZE, max_executions=EXECUTION_PROJECT_MAX, window_days=EXECUTION_WINDOW_DAYS, since=None):
+    start_time = max(filter(None, (execution_window_start(window_days), since)), default=None)
+
+    def fetch_page(page):
+        try:
+            response_data = fetch_project_executions(org_identifier, project_identifier, page, page_size, start_time)
+        except requests.exceptions.RequestException as e:
+            logging.error(f'Failed to fetch executions for project {project_identifier}: {e}')
+            return None
+        return response_data.get('data')
+
+    max_pages = -(-max_executions // page_size) if max_executions else None
+    for count, execution in enumerate(iter_pages(fetch_page, page_size, max_pages)):
+        if max_executions and count >= max_executions:
+            return
+        if start_time and execution.get('startTs', start_time) < start_time:
+            continue
+        if not execution.get('pipelineIdentifier'):
+            # A project-wide listing cannot tell which pipeline such an execution belongs to
+            logging.warning(f'Skipping execution {execution.get("planExecutionId")} of project {project_identifier} without a pipelineIdentifier')
+            metrics.count('executions_skipped_total', reason='no_pipeline_identifier')
+            continue
+        yield execution
+
+def get_project_build_times(org_identifier, project_identifier):
+    # Most recent executions first, capped per pipeline like the per-pipeline mode
+    per_pipeline = EXECUTION_PAGE_SIZE * EXECUTION_MAX_PAGES if EXECUTION_MAX_PAGES else None
+    cache = get_execution_cache()
+    if not cache:
+        executions_by_pipeline = defaultdict(list)
+        for execution in iter_project_executions(org_identifier, project_identifier):
+            executions = executions_by_pipeline[execution.get('pipelineIdentifier')]
+            if per_pipeline is None or len(executions) < per_pipeline:
+                executions.append(execution)
+        observe_executions(org_identifier, project_identifier, [execution_row(execution) for executions in executions_by_pipeline.values() for execution in executions])
+        return {pipeline_identifier: calculate_build_times(executions) for pipeline_identifier, executions in executions_by_pipeline.items()}
+    scope = ('project', org_identifier, project_identifier)
+    executions = [] if HARNESS_OFFLINE else list(iter_project_executions(org_identifier, project_identifier, since=cache.since(scope)))
+    cache.store(org_identifier, project_identifier, executions, scope)
+    cached_rows = cache.recent(org_identifier, project_identifier, start_time=execution_window_start(), limit=EXECUTION_PROJECT_MAX or None)
+    build_times_by_pipeline = defaultdict(list)
+    used = []
+    for row in merge_executions(executions, cached_rows, EXECUTION_PROJECT_MAX or None):
+        build_times = build_times_by_pipeline[row[0]]
+        if per_pipeline is None or len(build_times) < per_pipeline:
+            build_times.append(row[4])
+            used.append(row)
+    observe_executions(org_identifier, project_identifier, used)
+    return {pipeline_identifier: build_time_stats(build_times) for pipeline_identifier, build_times in build_times_by_pipeline.items()}
+
+class ProjectBuildTimes:
+    # Build times of every pipeline in a project from one bulk execution walk. Each project is
+    # walked once, however many pipelines (or crawl threads) ask for it.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.projects = {}
+
+    def prefetch(self, org_identifier, project_identifier, submit):
+        with self.lock:
+            if (org_identifier, project_identifier) not in self.projects:
+                self.projects[(org_identifier, project_identifier)] = submit('executions', get_project_build_times, org_identifier, project_identifier)
+
+    def get(self, org_identifier, project_identifier, pipeline_identifier):
+        key = (org_identifier, project_identifier)
+        with self.lock:
+            future = self.projects.get(key)
+            owner = future is None
+            if owner:
+                future = self.projects[key] = Future()
+        if owner:
+            try:
+                future.set_result(get_project_build_times(org_identifier, project_identifier))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result().get(pipeline_identifier) or BuildTimeStats()
+
+    def clear(self):
+        with self.lock:
+            self.projects.clear()
+
+project_build_times = ProjectBuildTimes()
 
 
 #  End Calculate build time
 
+# Concurrent crawl engine
+
+class CrawlEngine:
+    # Fetches projects, pipeline lists, pipeline/template YAML and execution summaries on a bounded
+    # thread pool, ahead of the analysis. The analysis itself still runs on the calling thread in
+    # the original org -> project -> pipeline order, so its results match the sequential walk.
+    def __init__(self, max_workers=CRAWL_CONCURRENCY, endpoint_limits=None, prefetch_limit=CRAWL_PREFETCH_LIMIT, incremental=None, templates=None, journal=None, shard=None, filters=None):
+        endpoint_limits = ENDPOINT_CONCURRENCY if endpoint_limits is None else endpoint_limits
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='crawl')
+        self.endpoint_semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in endpoint_limits.items()}
+        self.prefetch_limit = prefetch_limit
+        self.incremental = incremental
+        self.journal = journal
+        self.shard = shard
+        self.filters = filters
+        self.templates = templates if templates is not None else TemplateResolver()
+        self.templates.submit = self.submit
+        self.lock = threading.Lock()
+        self.org_identifiers = []
+        self.project_futures = {}
+        self.pipeline_list_futures = {}
+        self.pipeline_yaml_futures = {}
+        self.execution_futures = {}
+        self.cursor = [0, 0, 0]
+        self.prefetched = set()
+        self.last_pipeline_key = None
+
+    def submit(self, endpoint, func, *args, **kwargs):
+        semaphore = self.endpoint_semaphores.get(endpoint)
+
+        def call():
+            with semaphore or nullcontext():
+                return func(*args, **kwargs)
+        return self.executor.submit(call)
+
+    def close(self):
+        self.templates.submit = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self, orgs):
+        for org in orgs:
+            org_identifier = org['organization']['identifier']
+            self.org_identifiers.append(org_identifier)
+            future = self.submit('projects', get_projects, org_identifier)
+            future.add_done_callback(self._on_projects)
+            self.project_futures[org_identifier] = future
+
+    def _on_projects(self, future):
+        if future.cancelled() or future.exception():
+            return
+        for project in future.result():
+            org_identifier = project['projectResponse']['project']['orgIdentifier']
+            project_identifier = project['projectResponse']['project']['identifier']
+            if self.skip_project(org_identifier, project_identifier):
+                continue
+            with self.lock:
+                if (org_identifier, project_identifier) not in self.pipeline_list_futures:
+                    self.pipeline_list_futures[(org_identifier, project_identifier)] = self.submit('pipelines', get_pipelines, org_identifier, project_identifier)
+
+    def skip_project(self, org_identifier, project_identifier):
+        # Projects of other shards or outside the filters, or already finished in the journal of a resumed run
+        if not in_shard(self.shard, org_identifier, project_identifier) or not in_filters(self.filters, org_identifier, project_identifier):
+            return True
+        return bool(self.journal and self.journal.project_done(org_identifier, project_identifier))
+
+    def get_projects(self, org_identifier):
+        future = self.project_futures[org_identifier]
+        projects = future.result()
+        # The done callback may not have run yet when result() returns
+        self._on_projects(future)
+        return projects
+
+    def get_pipelines(self, org_identifier, project_identifier):
+        with self.lock:
+            future = self.pipeline_list_futures.get((org_identifier, project_identifier))
+        if future is None:
+            return get_pipelines(org_identifier, project_identifier)
+        return future.result()
+
+    def pump(self):
+        # Walk orgs -> projects -> pipelines in crawl order and start YAML fetches for the next
+        # pipelines, stopping at the first list that has not arrived yet or at the prefetch limit
+        while len(self.prefetched) < self.prefetch_limit and self.cursor[0] < len(self.org_identifiers):
+            org_index, project_index, pipeline_index = self.cursor
+            projects_future = self.project_futures[self.org_identifiers[org_index]]
+            if not projects_future.done() or projects_future.exception():
+                return
+            projects = projects_future.result()
+            if project_index >= len(projects):
+                self.cursor = [org_index + 1, 0, 0]
+                continue
+            project = projects[project_index]['projectResponse']['project']
+            org_identifier, project_identifier = project['orgIdentifier'], project['identifier']
+            if self.skip_project(org_identifier, project_identifier):
+                self.cursor = [org_index, project_index + 1, 0]
+                continue
+            with self.lock:
+                list_future = self.pipeline_list_futures.get((org_identifier, project_identifier))
+            if list_future is None or not list_future.done() or list_future.exception():
+                return
+            pipelines = list_future.result() or []
+            if pipeline_index >= len(pipelines):
+                self.cursor = [org_index, project_index + 1, 0]
+                continue
+            self.cursor[2] += 1
+            self.prefetch_pipeline(org_identifier, project_identifier, pipelines[pipeline_index])
+
+    def prefetch_pipeline(self, org_identifier, project_identifier, pipeline):
+        pipeline_identifier = pipeline['identifier']
+        key = (org_identifier, project_identifier, pipeline_identifier)
+        if self.journal and self.journal.pipeline_record(*key):
+            return
+        if not in_filters(self.filters, org_identifier, project_identifier, pipeline_identifier):
+            return
+        with self.lock:
+            if key in self.prefetched:
+                return
+            self.prefetched.add(key)
+            if PREFILTER_NON_CI and is_non_ci_pipeline(pipeline):
+                return
+            previous = self.incremental.unchanged_record(org_identifier, project_identifier, pipeline) if self.incremental else None
+            if EXECUTION_FETCH_MODE == 'project':
+                project_build_times.prefetch(org_identifier, project_identifier, self.submit)
+            if previous:
+                # Unchanged since the last run: only its build times are refreshed
+                if previous.build_times is not None:
+                    self.prefetch_build_times(key)
+                return
+            future = self.submit('pipeline_yaml', get_pipeline_yaml, org_identifier, project_identifier, pipeline_identifier, pipeline.get('storeType', 'INLINE'), pipeline.get('connectorRef'), pipeline.get('repoName'), pipeline.get('lastUpdatedAt'))
+            self.pipeline_yaml_futures[key] = future
+        future.add_done_callback(lambda done: self._on_pipeline_yaml(key, done))
+
+    def _on_pipeline_yaml(self, key, future):
+        if future.cancelled() or future.exception():
+            return
+        pipeline_yaml, error = future.result()
+        if error or not pipeline_yaml:
+            return
+        org_identifier, project_identifier, pipeline_identifier = key
+        with self.lock:
+            self.prefetch_build_times(key)
+        pipeline = pipeline_yaml.get('pipeline', {})
+        if 'template' in pipeline and 'templateRef' in pipeline['template']:
+            self.prefetch_template(template_key(pipeline['template']['templateRef'], pipeline['template'].get('versionLabel'), 'project', org_identifier, project_identifier))
+        for key in stage_template_keys(pipeline.get('stages', []), 'project', org_identifier, project_identifier):
+            self.prefetch_template(key)
+
+    def prefetch_build_times(self, key):
+        # Caller holds self.lock. In project mode the project's bulk walk already covers the pipeline.
+        if EXECUTION_FETCH_MODE != 'project':
+            self.execution_futures[key] = self.submit('executions', get_build_time_stats, *key)
+
+    def prefetch_template(self, key):
+        future = self.templates.prefetch(key, self.submit)
+        if future is not None:
+            future.add_done_callback(lambda done: self._on_template_yaml(key, done))
+
+    def _on_template_yaml(self, key, future):
+        if future.cancelled() or future.exception():
+            return
+        template_yaml, error = future.result()
+        if error or not template_yaml:
+            return
+        scope, org_identifier, project_identifier, _, _ = key
+        stages = template_yaml.get('template', {}).get('spec', {}).get('stages', [])
+        for nested_key in stage_template_keys(stages, scope, org_identifier, project_identifier):
+            self.prefetch_template(nested_key)
+
+    def consume(self, org_identifier, project_identifier, pipeline_identifier):
+        # Called as the analysis moves on to the next pipeline; frees its prefetch slot
+        key = (org_identifier, project_identifier, pipeline_identifier)
+        self.pump()
+        with self.lock:
+            # Leftovers of the previous pipeline are no longer needed once we move on
+            if self.last_pipeline_key is not None:
+                self.pipeline_yaml_futures.pop(self.last_pipeline_key, None)
+                self.execution_futures.pop(self.last_pipeline_key, None)
+            self.last_pipeline_key = key
+            self.prefetched.discard(key)
+        self.pump()
+
+    def get_pipeline_yaml(self, org_identifier, project_identifier, pipeline_identifier, store_type, connector_ref=None, repo_name=None, last_updated=None):
+        with self.lock:
+            future = self.pipeline_yaml_futures.pop((org_identifier, project_identifier, pipeline_identifier), None)
+        if future is None:
+            return get_pipeline_yaml(org_identifier, project_identifier, pipeline_identifier, store_type, connector_ref, repo_name, last_updated)
+        return future.result()
+
+    def get_build_time_stats(self, org_identifier, project_identifier, pipeline_identifier):
+        with self.lock:
+            future = self.execution_futures.pop((org_identifier, project_identifier, pipeline_identifier), None)
+        if future is None:
+            return get_build_time_stats(org_identifier, project_identifier, pipeline_identifier)
+        return future.result()
+
+# End concurrent crawl engine
+
+# Incremental re-analysis
+
+def read_pipeline_state(path):
+    # (records, projects): projects maps each crawled org to its crawled projects, including the
+    # ones without pipelines; it is None for states written before it was saved
+    try:
+        with open(path) as state_file:
+            state = json.load(state_file)
+    except FileNotFoundError:
+        return None
+    return [PipelineRecord.from_dict(record) for record in state['pipelines']], state.get('projects')
+
+def load_pipeline_state(path):
+    state = read_pipeline_state(path)
+    return state[0] if state else None
+
+class CrawlJournal:
+    # Append-only JSON lines: one line per analyzed pipeline record and one per finished project
+    # with its pipelines in crawl order. Lines are flushed as they are written, so a killed run
+    # loses at most the pipeline it was on; a torn last line is cut off when resuming, so appended
+    # lines start on a line of their own. The result store is committed before each pipeline line,
+    # so every journaled pipeline has its executions.
+    def __init__(self, path=CRAWL_JOURNAL_PATH, resume=False, store=None):
+        self.path = path
+        self.store = store
+        self.records = {}
+        self.projects = {}
+        self.stats = {'resumed_pipelines': 0, 'resumed_projects': 0}
+        if resume:
+            self.load()
+        self.file = open(path, 'a' if resume else 'w')
+
+    def load(self):
+        try:
+            with open(self.path, 'rb+') as journal_file:
+                good_end = 0
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line) if line.endswith(b'\n') else None
+                    except ValueError:
+                        entry = None
+                    if entry is None:
+                        logging.warning(f'Skipping a torn line in the crawl journal {self.path}')
+                        continue
+                    good_end = journal_file.tell()
+                    if 'record' in entry:
+                        record = PipelineRecord.from_dict(entry['record'])
+                        self.records[(record.org_identifier, record.project_identifier, record.pipeline_identifier)] = record
+                    else:
+                        self.projects[tuple(entry['project'])] = entry['pipelines']
+                journal_file.truncate(good_end)
+        except FileNotFoundError:
+            print(f'No crawl journal at {self.path}, running a full crawl')
+
+    def project_done(self, org_identifier, project_identifier):
+        return (org_identifier, project_identifier) in self.projects
+
+    def project_records(self, org_identifier, project_identifier):
+        pipeline_identifiers = self.projects.get((org_identifier, project_identifier))
+        if pipeline_identifiers is None:
+            return None
+        self.stats['resumed_projects'] += 1
+        self.stats['resumed_pipelines'] += len(pipeline_identifiers)
+        return [self.records[(org_identifier, project_identifier, pipeline_identifier)] for pipeline_identifier in pipeline_identifiers]
+
+    def pipeline_record(self, org_identifier, project_identifier, pipeline_identifier):
+        return self.records.get((org_identifier, project_identifier, pipeline_identifier))
+
+    def add_pipeline(self, record):
+        if self.store:
+            self.store.commit()
+        self.file.write(json.dumps({'record': record.to_dict()}) + '\n')
+        self.file.flush()
+
+    def finish_project(self, org_identifier, project_identifier, pipeline_identifiers):
+        self.file.write(json.dumps({'project': [org_identifier, project_identifier], 'pipelines': pipeline_identifiers}) + '\n')
+        self.file.flush()
+
+    def close(self, completed=True):
+        self.file.close()
+        if completed:
+            os.remove(self.path)
+
+class IncrementalState:
+    # Previous run's per-pipeline records. A record is reused when the pipeline's lastUpdatedAt is
+    # unchanged and none of the templates it depends on changed content since it was analyzed.
+    # REMOTE pipelines are always re-analyzed: a push to git does not change their lastUpdatedAt.
+    def __init__(self, previous_records, templates):
+        self.previous = {(record.org_identifier, record.project_identifier, record.pipeline_identifier): record for record in previous_records}
+        self.templates = templates
+        self.stats = {'previous': len(self.previous), 'reused': 0, 'template_changed': 0}
+
+    def unchanged_record(self, org_identifier, project_identifier, pipeline):
+        previous = self.previous.get((org_identifier, project_identifier, pipeline['identifier']))
+        if not previous or previous.error is not None or not previous.analyzed:
+            return None
+        if pipeline.get('storeType', 'INLINE') != 'INLINE':
+            return None
+        if previous.last_updated_at is None or previous.last_updated_at != pipeline.get('lastUpdatedAt'):
+            return None
+        return previous
+
+    def reusable_record(self, org_identifier, project_identifier, pipeline):
+        previous = self.unchanged_record(org_identifier, project_identifier, pipeline)
+        if not previous:
+            return None
+        for key, fingerprint in previous.templates:
+            if self.templates.fingerprint(key) != fingerprint:
+                self.stats['template_changed'] += 1
+                return None
+        self.stats['reused'] += 1
+        return previous
+
+    def prefetch_templates(self, engine):
+        for record in self.previous.values():
+            for key, _ in record.templates:
+                engine.prefetch_template(key)
+
+# Pipeline index
+
+def template_label(key):
+    # A template key as its templateRef, qualified by the org and project it lives in
+    scope, org_identifier, project_identifier, template_id, version_label = key
+    ref = {'account': f'account.{template_id}', 'org': f'{org_identifier}/org.{template_id}'}.get(scope, f'{org_identifier}/{project_identifier}/{template_id}')
+    return f'{ref}@{version_label}' if version_label else ref
+
+def template_sort_key(key):
+    return tuple('' if part is None else part for part in key)
+
+class PipelineIndex:
+    # Inverted indexes over the pipeline records: template -> pipelines using it directly, template
+    # -> pipelines using it at all (directly or through nested templates), infrastructure type ->
+    # pipelines and pipeline -> templates, plus the template -> nested template edges. Pipelines are
+    # (org, project, pipeline) tuples and templates are template keys.
+    def __init__(self):
+        self.pipelines = {}
+        self.direct = defaultdict(set)
+        self.used = defaultdict(set)
+        self.infra = defaultdict(set)
+        self.nested = {}
+        self._parents = None
+
+    def add(self, records):
+        for record in records:
+            pipeline = (record.org_identifier, record.project_identifier, record.pipeline_identifier)
+            keys = tuple(key for key, _ in record.templates)
+            self.pipelines[pipeline] = (record.direct_templates, keys)
+            for key in record.direct_templates:
+                self.direct[key].add(pipeline)
+            for key in keys:
+                self.used[key].add(pipeline)
+            for infra_type in record.stage_infra_types:
+                self.infra[infra_type].add(pipeline)
+        self._parents = None
+
+    def add_template_edges(self, templates, previous=None):
+        # Edges of the templates resolved in this run; templates that were not (their pipelines
+        # were reused or resumed) keep their edges from the previous index
+        with templates.lock:
+            edges = dict(templates.edges)
+        for key, nested in edges.items():
+            if key in self.used:
+                self.nested[key] = tuple(sorted(nested, key=template_sort_key))
+        if previous:
+            for key, nested in previous.nested.items():
+                if key in self.used:
+                    self.nested.setdefault(key, nested)
+        self._parents = None
+
+    def merge(self, other):
+        self.pipelines.update(other.pipelines)
+        for field in ('direct', 'used', 'infra'):
+            for key, pipelines in getattr(other, field).items():
+                getattr(self, field)[key].update(pipelines)
+        for key, nested in other.nested.items():
+            self.nested.setdefault(key, nested)
+        self._parents = None
+        return self
+
+    def find_templates(self, template_ref, version_label=None, org_identifier=None, project_identifier=None):
+        # Keys of the templates a templateRef (account.x, org.x or x) can mean, in every version,
+        # org and project unless those are given
+        if template_ref.startswith('account.'):
+            scope, template_id = 'account', template_ref[len('account.'):]
+        elif template_ref.startswith('org.'):
+            scope, template_id = 'org', template_ref[len('org.'):]
+        else:
+            scope, template_id = 'project', template_ref
+        keys = set(self.used) | set(self.nested)
+        return sorted((
+            key for key in keys
+            if key[0] == scope and key[3] == template_id
+            and (version_label is None or key[4] == version_label)
+            and (org_identifier is None or key[1] in (None, org_identifier))
+            and (project_identifier is None or key[2] in (None, project_identifier))
+        ), key=template_sort_key)
+
+    def parents(self, key):
+        if self._parents is None:
+            parents = defaultdict(set)
+            for parent, nested in self.nested.items():
+                for child in nested:
+                    parents[child].add(parent)
+            self._parents = parents
+        return self._parents.get(key, ())
+
+    def impact(self, keys):
+        # What a change to these templates reaches: every template that includes one of them,
+        # directly or not, and every pipeline that uses one of them
+        keys = set(keys)
+        templates = set()
+        pending = list(keys)
+        while pending:
+            for parent in self.parents(pending.pop()):
+                if parent not in templates and parent not in keys:
+                    templates.add(parent)
+                    pending.append(parent)
+        direct = set().union(*(self.direct.get(key, ()) for key in keys))
+        used = set().union(*(self.used.get(key, ()) for key in keys))
+        return {
+            'templates': sorted(templates, key=template_sort_key),
+            'direct_pipelines': sorted(direct),
+            'pipelines': sorted(used)
+        }
+
+    def pipelines_on(self, infra_type, org_identifier=None, project_identifier=None):
+        return sorted(
+            pipeline for pipeline in self.infra.get(infra_type, ())
+            if (org_identifier is None or pipeline[0] == org_identifier) and (project_identifier is None or pipeline[1] == project_identifier)
+        )
+
+    def pipeline_templates(self, org_identifier, project_identifier, pipeline_identifier):
+        return self.pipelines.get((org_identifier, project_identifier, pipeline_identifier))
+
+    def to_dict(self):
+        # Pipelines and templates are written once each and referenced by position
+        pipelines = sorted(self.pipelines)
+        pipeline_ids = {pipeline: index for index, pipeline in enumerate(pipelines)}
+        templates = sorted(set(self.used) | set(self.nested), key=template_sort_key)
+        template_ids = {key: index for index, key in enumerate(templates)}
+
+        def ids(items, table):
+            return sorted(table[item] for item in items)
+
+        return {
+            'pipelines': [list(pipeline) for pipeline in pipelines],
+            'templates': [list(key) for key in templates],
+            'pipeline_templates': [{'direct': ids(direct, template_ids), 'all': ids(keys, template_ids)} for direct, keys in (self.pipelines[pipeline] for pipeline in pipelines)],
+            'template_pipelines': [{'direct': ids(self.direct.get(key, ()), pipeline_ids), 'all': ids(self.used.get(key, ()), pipeline_ids)} for key in templates],
+            'nested_templates': [ids(self.nested.get(key, ()), template_ids) for key in templates],
+            'infra_pipelines': {infra_type: ids(members, pipeline_ids) for infra_type, members in sorted(self.infra.items())}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        pipelines = [tuple(sys.intern(part) for part in pipeline) for pipeline in data['pipelines']]
+        templates = [template_key_from_list(key) for key in data['templates']]
+        for pipeline, entry in zip(pipelines, data['pipeline_templates']):
+            index.pipelines[pipeline] = (tuple(templates[i] for i in entry['direct']), tuple(templates[i] for i in entry['all']))
+        for key, entry, nested in zip(templates, data['template_pipelines'], data['nested_templates']):
+            if entry['direct']:
+                index.direct[key] = {pipelines[i] for i in entry['direct']}
+            if entry['all']:
+                index.used[key] = {pipelines[i] for i in entry['all']}
+            if nested:
+                index.nested[key] = tuple(templates[i] for i in nested)
+        for infra_type, ids in data['infra_pipelines'].items():
+            index.infra[infra_type] = {pipelines[i] for i in ids}
+        return index
+
+    def write(self, path):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as index_file:
+            json.dump(self.to_dict(), index_file)
+        os.replace(temp_path, path)
+
+def load_pipeline_index(path):
+    try:
+        with open(path) as index_file:
+            return PipelineIndex.from_dict(json.load(index_file))
+    except FileNotFoundError:
+        return None
+
+def query_index(index, kind, value, version_label=None, org_identifier=None, project_identifier=None):
+    # kind is 'template' (value is a templateRef; what uses it and what a change to it reaches),
+    # 'infra' (value is an infrastructure type) or 'pipeline' (value is org/project/pipeline)
+    def in_scope(pipeline):
+        return (org_identifier is None or pipeline[0] == org_identifier) and (project_identifier is None or pipeline[1] == project_identifier)
+
+    def labels(pipelines):
+        return ['/'.join(pipeline) for pipeline in pipelines if in_scope(pipeline)]
+
+    if kind == 'template':
+        keys = index.find_templates(value, version_label, org_identifier, project_identifier)
+        impact = index.impact(keys)
+        return {
+            'templates': [template_label(key) for key in keys],
+            'included_by': [template_label(key) for key in impact['templates']],
+            'direct_pipelines': labels(impact['direct_pipelines']),
+            'pipelines': labels(impact['pipelines'])
+        }
+    if kind == 'infra':
+        return {'pipelines': labels(index.pipelines_on(value, org_identifier, project_identifier))}
+    if kind == 'pipeline':
+        parts = value.split('/')
+        if len(parts) != 3:
+            raise ValueError(f'Expected org/project/pipeline, got {value!r}')
+        entry = index.pipeline_templates(*parts)
+        if entry is None:
+            raise ValueError(f'Pipeline {value} is not in the index')
+        direct, keys = entry
+        return {
+            'direct_templates': sorted(template_label(key) for key in direct),
+            'templates': sorted(template_label(key) for key in keys)
+        }
+    raise ValueError(f'Unknown query {kind!r}')
+
+def load_index(index_path=PIPELINE_INDEX_PATH):
+    index = load_pipeline_index(index_path)
+    if index is None:
+        raise FileNotFoundError(f'No pipeline index at {index_path}; run a crawl or export first')
+    return index
+
+# End pipeline index
+
 def export_to_csv(org_summary, account_summary):
     # Dynamically determine the union of all keys in org_summary to include in the CSV
     all_keys = set()
@@ -452,7 +2500,8 @@ def export_to_csv(org_summary, account_summary):
     
     fieldnames_account = [
         'total_orgs', 'total_projects', 'total_pipelines', 'total_pipelines_with_ci', 
-        'total_ci_stages', 'template_count', 'avg_build_time', 'max_build_time'
+        'total_ci_stages', 'template_count', 'avg_build_time', 'max_build_time',
+        'p50_build_time', 'p90_build_time', 'p99_build_time'
     ] + list(all_keys)
 
     with open('account_summary.csv', 'w', newline='') as csvfile:
@@ -467,14 +2516,18 @@ def export_to_csv(org_summary, account_summary):
             'total_ci_stages': account_summary['total_ci_stages'],
             'template_count': account_summary['template_count'],
             'avg_build_time': account_summary['avg_build_time'],
-            'max_build_time': account_summary['max_build_time']
+            'max_build_time': account_summary['max_build_time'],
+            'p50_build_time': account_summary['p50_build_time'],
+            'p90_build_time': account_summary['p90_build_time'],
+            'p99_build_time': account_summary['p99_build_time']
         }
         account_summary_data.update(account_summary['infra_percentage'])
         writer.writerow(account_summary_data)
 
     fieldnames_org = [
         'org_identifier', 'total_pipelines', 'total_pipelines_with_ci', 
-        'total_ci_stages', 'template_count', 'avg_build_time', 'max_build_time'
+        'total_ci_stages', 'template_count', 'avg_build_time', 'max_build_time',
+        'p50_build_time', 'p90_build_time', 'p99_build_time'
     ] + list(all_keys)
 
     with open('org_summary.csv', 'w', newline='') as csvfile:
@@ -489,47 +2542,271 @@ def export_to_csv(org_summary, account_summary):
                 'total_ci_stages': summary['total_ci_stages'],
                 'template_count': summary['template_count'],
                 'avg_build_time': summary['avg_build_time'],
-                'max_build_time': summary['max_build_time']
+                'max_build_time': summary['max_build_time'],
+                'p50_build_time': summary['p50_build_time'],
+                'p90_build_time': summary['p90_build_time'],
+                'p99_build_time': summary['p99_build_time']
             }
             org_summary_data.update(summary['infra_percentage'])
             writer.writerow(org_summary_data)
 
-def export_pipeline_details_to_csv(pipeline_details):
-    fieldnames = [
-        'pipeline_identifier', 'org_identifier', 'project_identifier', 'pipeline_name', 
-        'ci_stages_count', 'total_stages', 'template_count', 'templates_used', 'infra_types',
-        'avg_build_time', 'max_build_time'  # Include these additional fields
-    ]
+PIPELINE_DETAIL_FIELDS = [
+    'pipeline_identifier', 'org_identifier', 'project_identifier', 'pipeline_name', 
+    'ci_stages_count', 'total_stages', 'template_count', 'templates_used', 'infra_types',
+    'avg_build_time', 'max_build_time',  # Include these additional fields
+    'p50_build_time', 'p90_build_time', 'p99_build_time'
+]
+PIPELINE_ERROR_FIELDS = ['org_identifier', 'project_identifier', 'pipeline_identifier', 'error']
 
+def export_pipeline_details_to_csv(pipeline_details):
     with open('pipeline_details.csv', 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=PIPELINE_DETAIL_FIELDS)
 
         writer.writeheader()
         for detail in pipeline_details:
             writer.writerow(detail)
-            
-            # detail_data = {
-            #     'org_identifier': detail['org_identifier'],
-            #     'project_identifier': detail['project_identifier'],
-            #     'pipeline_identifier': detail['pipeline_identifier'],
-            #     'pipeline_name': detail['pipeline_name'],
-            #     'ci_stages_count': detail['ci_stages_count'],
-            #     'total_stages': detail['total_stages'],
-            #     'template_count': detail['template_count'],
-            #     'templates_used': detail.get('templates_used', '')
-            # }
-            # detail_data.update(detail['infra_types'])
-            # writer.writerow(detail_data)
 
 def export_pipeline_errors_to_csv(pipeline_errors):
     with open('pipeline_errors.csv', 'w', newline='') as csvfile:
-        fieldnames = ['org_identifier', 'project_identifier', 'pipeline_identifier', 'error']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=PIPELINE_ERROR_FIELDS)
 
         writer.writeheader()
         for error in pipeline_errors:
             writer.writerow(error)
 
+def read_pipeline_details(path='pipeline_details.csv'):
+    numeric_fields = {'ci_stages_count': int, 'total_stages': int, 'template_count': int, 'avg_build_time': float, 'max_build_time': float, 'p50_build_time': float, 'p90_build_time': float, 'p99_build_time': float}
+    with open(path, newline='') as csvfile:
+        for detail in csv.DictReader(csvfile):
+            for field, convert in numeric_fields.items():
+                if detail.get(field):
+                    detail[field] = convert(detail[field])
+            yield detail
+
+class ResultSink:
+    # Appends pipeline records to pipeline_details.csv, pipeline_errors.csv and the pipeline state
+    # file as pipelines are analyzed, instead of holding them until the end of the run. The CSVs are
+    # written in place so an interrupted run keeps its rows; the state file only replaces the
+    # previous one when the run completes.
+    def __init__(self, details_path='pipeline_details.csv', errors_path='pipeline_errors.csv', state_path=PIPELINE_STATE_PATH, flush_rows=RESULT_FLUSH_ROWS, flush_seconds=RESULT_FLUSH_SECONDS, store=None):
+        self.details_path = details_path
+        self.store = store
+        self.state_path = state_path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.details_file = open(details_path, 'w', newline='')
+        self.details_writer = csv.DictWriter(self.details_file, fieldnames=PIPELINE_DETAIL_FIELDS)
+        self.details_writer.writeheader()
+        self.errors_file = open(errors_path, 'w', newline='')
+        self.errors_writer = csv.DictWriter(self.errors_file, fieldnames=PIPELINE_ERROR_FIELDS)
+        self.errors_writer.writeheader()
+        self.state_file = open(f'{state_path}.tmp', 'w') if state_path else None
+        if self.state_file:
+            self.state_file.write(f'{{"generated_at": {json.dumps(time.time())}, "pipelines": [')
+        self.stats = {'records': 0, 'details': 0, 'errors': 0, 'flushes': 0}
+        self.pending = 0
+        self.flushed_at = time.monotonic()
+
+    def add(self, records):
+        if self.store:
+            self.store.add(records)
+        for record in records:
+            if record.analyzed:
+                self.details_writer.writerow(record.detail_row())
+                self.stats['details'] += 1
+            if record.error is not None:
+                self.errors_writer.writerow(record.error_row())
+                self.stats['errors'] += 1
+            if self.state_file:
+                self.state_file.write((', ' if self.stats['records'] else '') + json.dumps(record.to_dict()))
+            self.stats['records'] += 1
+            self.pending += 1
+        if self.pending >= self.flush_rows or time.monotonic() - self.flushed_at >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        for result_file in (self.details_file, self.errors_file, self.state_file):
+            if result_file:
+                result_file.flush()
+        if self.store:
+            self.store.commit()
+        self.stats['flushes'] += 1
+        self.pending = 0
+        self.flushed_at = time.monotonic()
+
+    @property
+    def closed(self):
+        return self.details_file.closed
+
+    def close(self, completed=True, projects=None):
+        # projects (org -> crawled project identifiers) keeps orgs and projects without pipelines
+        # in the state, so summaries rebuilt from it count them
+        self.flush()
+        self.details_file.close()
+        self.errors_file.close()
+        if self.state_file:
+            self.state_file.write(']' + (f', "projects": {json.dumps(projects)}' if projects is not None else '') + '}')
+            self.state_file.close()
+            if completed:
+                os.replace(f'{self.state_path}.tmp', self.state_path)
+        if self.store:
+            self.store.close(completed)
+
+RESULT_STORE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS runs (
+        run_date TEXT PRIMARY KEY,
+        account_identifier TEXT,
+        started_at REAL NOT NULL,
+        finished_at REAL,
+        completed INTEGER NOT NULL DEFAULT 0
+    )''',
+    '''CREATE TABLE IF NOT EXISTS pipelines (
+        run_date TEXT NOT NULL,
+        org_identifier TEXT NOT NULL,
+        project_identifier TEXT NOT NULL,
+        pipeline_identifier TEXT NOT NULL,
+        pipeline_name TEXT,
+        last_updated_at INTEGER,
+        has_ci INTEGER NOT NULL,
+        ci_stages_count INTEGER NOT NULL,
+        total_stages INTEGER,
+        template_count INTEGER,
+        avg_build_time REAL,
+        max_build_time REAL,
+        failed INTEGER NOT NULL,
+        PRIMARY KEY (run_date, org_identifier, project_identifier, pipeline_identifier)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS pipeline_templates (
+        run_date TEXT NOT NULL,
+        org_identifier TEXT NOT NULL,
+        project_identifier TEXT NOT NULL,
+        pipeline_identifier TEXT NOT NULL,
+        template_scope TEXT NOT NULL,
+        template_org TEXT,
+        template_project TEXT,
+        template_identifier TEXT NOT NULL,
+        version_label TEXT,
+        fingerprint TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS pipeline_templates_run ON pipeline_templates (run_date, template_identifier)',
+    '''CREATE TABLE IF NOT EXISTS pipeline_infra (
+        run_date TEXT NOT NULL,
+        org_identifier TEXT NOT NULL,
+        project_identifier TEXT NOT NULL,
+        pipeline_identifier TEXT NOT NULL,
+        infra_type TEXT NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS pipeline_infra_run ON pipeline_infra (run_date, infra_type)',
+    '''CREATE TABLE IF NOT EXISTS executions (
+        run_date TEXT NOT NULL,
+        org_identifier TEXT NOT NULL,
+        project_identifier TEXT NOT NULL,
+        pipeline_identifier TEXT NOT NULL,
+        plan_execution_id TEXT NOT NULL,
+        status TEXT,
+        start_ts INTEGER,
+        build_time REAL NOT NULL,
+        PRIMARY KEY (run_date, plan_execution_id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS errors (
+        run_date TEXT NOT NULL,
+        org_identifier TEXT NOT NULL,
+        project_identifier TEXT NOT NULL,
+        pipeline_identifier TEXT NOT NULL,
+        error TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS errors_run ON errors (run_date)',
+]
+RESULT_STORE_TABLES = ['pipelines', 'pipeline_templates', 'pipeline_infra', 'executions', 'errors']
+
+class ResultStore:
+    # Normalized, typed copy of a run's results. Every table carries run_date as the leading key
+    # column, so each day is one partition: queries across runs or orgs are index scans, and a rerun
+    # on the same day replaces that day's rows. The runs table says whether a partition completed.
+    # A scoped run (shard or crawl filters) only replaces the rows inside its scope and leaves the
+    # runs table to the account-wide runs.
+    def __init__(self, path=RESULT_STORE_PATH, run_date=None, resume=False, shard=None, filters=None):
+        self.run_date = run_date or time.strftime('%Y-%m-%d')
+        self.scoped = bool(shard or filters)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in RESULT_STORE_SCHEMA:
+            self.connection.execute(statement)
+        # Stores written before pipeline_infra lost its stage_count column (always 1)
+        if 'stage_count' in {column[1] for column in self.connection.execute('PRAGMA table_info(pipeline_infra)')}:
+            self.connection.execute('ALTER TABLE pipeline_infra DROP COLUMN stage_count')
+        scope = ''
+        if self.scoped:
+            self.connection.create_function(
+                'in_scope', 3, lambda org_identifier, project_identifier, pipeline_identifier: in_shard(shard, org_identifier, project_identifier) and in_filters(filters, org_identifier, project_identifier, pipeline_identifier),
+                deterministic=True
+            )
+            scope = ' AND in_scope(org_identifier, project_identifier, pipeline_identifier)'
+        self.connection.execute('BEGIN')
+        for table in RESULT_STORE_TABLES:
+            # Resumed pipelines are rebuilt from the journal, but their executions are not fetched
+            # again: the journal commits them before it records a pipeline (see CrawlJournal)
+            if not (resume and table == 'executions'):
+                self.connection.execute(f'DELETE FROM {table} WHERE run_date = ?{scope}', (self.run_date,))
+        if not self.scoped:
+            self.connection.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, NULL, 0)', (self.run_date, HARNESS_ACCOUNT_ID, time.time()))
+
+    def add(self, records):
+        pipelines, templates, infra, errors = [], [], [], []
+        for record in records:
+            pipeline = (self.run_date, record.org_identifier, record.project_identifier, record.pipeline_identifier)
+            build_times = record.build_times
+            pipelines.append(pipeline + (
+                record.pipeline_name if record.analyzed else None, record.last_updated_at, record.pipelines_with_ci, record.ci_stages,
+                record.total_stages, record.template_count if record.analyzed else None,
+                build_times.mean if build_times is not None else None,
+                build_times.max if build_times is not None else None,
+                int(record.error is not None)
+            ))
+            templates.extend(pipeline + key + (fingerprint,) for key, fingerprint in record.templates)
+            # One row per infrastructure type the pipeline's CI stages run on, not collapsed to Mixed
+            infra.extend(pipeline + (infra_type,) for infra_type in record.stage_infra_types)
+            if record.error is not None:
+                errors.append(pipeline + (record.error,))
+        with self.lock:
+            self.connection.executemany('INSERT OR REPLACE INTO pipelines VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', pipelines)
+            self.connection.executemany('INSERT INTO pipeline_templates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', templates)
+            self.connection.executemany('INSERT INTO pipeline_infra VALUES (?, ?, ?, ?, ?)', infra)
+            self.connection.executemany('INSERT INTO errors VALUES (?, ?, ?, ?, ?)', errors)
+
+    def add_executions(self, org_identifier, project_identifier, rows):
+        # rows as returned by merge_executions
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO executions VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(self.run_date, org_identifier, project_identifier, pipeline_identifier, plan_execution_id, status, start_ts, build_time)
+                 for pipeline_identifier, plan_execution_id, status, start_ts, build_time in rows if plan_execution_id is not None]
+            )
+
+    def commit(self):
+        with self.lock:
+            self.connection.execute('COMMIT')
+            self.connection.execute('BEGIN')
+
+    def close(self, completed=True):
+        with self.lock:
+            if not self.scoped:
+                self.connection.execute('UPDATE runs SET finished_at = ?, completed = ? WHERE run_date = ?', (time.time(), int(completed), self.run_date))
+            self.connection.execute('COMMIT')
+            self.connection.close()
+
+_result_store = None
+
+def set_result_store(store):
+    global _result_store
+    _result_store = store
+
+def observe_executions(org_identifier, project_identifier, rows):
+    if _result_store:
+        _result_store.add_executions(org_identifier, project_identifier, rows)
+
 def export_template_details_to_csv(template_count):
     with open('template_details.csv', 'w', newline='') as csvfile:
         fieldnames = ['template_ref', 'count']
@@ -539,193 +2816,291 @@ def export_template_details_to_csv(template_count):
         for template_ref, count in template_count.items():
             writer.writerow({'template_ref': template_ref, 'count': count})
 
-def update_spreadsheet(org_summary, account_summary, pipeline_details, template_count_dict):
-    file_path = '/Users/diegopereira/Documents/Development/git/serenity/CI-AdoptionPlan-Hosted_Builds_Migration.xlsx'
+SPREADSHEET_SHEETS = ['Account Summary', 'Org Summary', 'Pipeline Details', 'Template Details']
 
-    try:
-        workbook = openpyxl.load_workbook(file_path)
-    except FileNotFoundError:
-        print("Spreadsheet not found. Creating a new one.")
-        workbook = openpyxl.Workbook()
-
-    # Remove the default sheet if it exists
-    if 'Sheet' in workbook.sheetnames:
-        del workbook['Sheet']
-
-    # Create or update the 'Account Summary' sheet
-    if 'Account Summary' not in workbook.sheetnames:
-        workbook.create_sheet('Account Summary')
-    account_sheet = workbook['Account Summary']
-
-    # Convert account_summary to DataFrame for easier manipulation
-    account_summary_df = pd.DataFrame([account_summary])
-
-    # Write the account_summary DataFrame to the sheet
-    for r_idx, row in enumerate(dataframe_to_rows(account_summary_df, index=False, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            if isinstance(value, dict):
-                value = json.dumps(value)  # Convert dict to JSON string
-            account_sheet.cell(row=r_idx, column=c_idx, value=value)
-
-    # Create or update the 'Org Summary' sheet
-    if 'Org Summary' not in workbook.sheetnames:
-        workbook.create_sheet('Org Summary')
-    org_sheet = workbook['Org Summary']
-
-    # Convert org_summary to DataFrame for easier manipulation
-    org_summary_df = pd.DataFrame.from_dict(org_summary, orient='index')
-
-    # Write the org_summary DataFrame to the sheet
-    for r_idx, row in enumerate(dataframe_to_rows(org_summary_df, index=True, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            if isinstance(value, dict):
-                value = json.dumps(value)  # Convert dict to JSON string
-            org_sheet.cell(row=r_idx, column=c_idx, value=value)
-
-    # Create or update the 'Pipeline Details' sheet
-    if 'Pipeline Details' not in workbook.sheetnames:
-        workbook.create_sheet('Pipeline Details')
-    pipeline_sheet = workbook['Pipeline Details']
-
-    # Convert pipeline_details to DataFrame for easier manipulation
-    pipeline_details_df = pd.DataFrame(pipeline_details)
-
-    # Write the pipeline_details DataFrame to the sheet
-    for r_idx, row in enumerate(dataframe_to_rows(pipeline_details_df, index=False, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            pipeline_sheet.cell(row=r_idx, column=c_idx, value=value)
-
-    # Create or update the 'Template Details' sheet
-    if 'Template Details' not in workbook.sheetnames:
-        workbook.create_sheet('Template Details')
-    template_sheet = workbook['Template Details']
+def spreadsheet_value(value):
+    if isinstance(value, dict):
+        return json.dumps(value)  # Convert dict to JSON string
+    return value
+
+def spreadsheet_rows(org_summary, account_summary, pipeline_details, template_count_dict):
+    # Header and rows of each generated sheet, streamed so pipeline details are never held in memory
+    account_fields = list(account_summary)
+    yield 'Account Summary', account_fields, [[spreadsheet_value(account_summary[field]) for field in account_fields]]
+    org_fields = list(next(iter(org_summary.values()), {}))
+    yield 'Org Summary', ['org_identifier'] + org_fields, ([org_identifier] + [spreadsheet_value(summary.get(field)) for field in org_fields] for org_identifier, summary in org_summary.items())
+    yield 'Pipeline Details', PIPELINE_DETAIL_FIELDS, ([detail.get(field) for field in PIPELINE_DETAIL_FIELDS] for detail in pipeline_details)
+    yield 'Template Details', ['template_ref', 'count'], ([template_ref, count] for template_ref, count in template_count_dict.items())
+
+def update_spreadsheet(org_summary, account_summary, pipeline_details, template_count_dict, input_path=SPREADSHEET_INPUT_PATH, output_path=SPREADSHEET_OUTPUT_PATH):
+    if not output_path:
+        return
 
     # Ensure template_count_dict is a dictionary
     if not isinstance(template_count_dict, dict):
         raise ValueError("template_count_dict should be a dictionary")
 
-    # Convert template_count_dict to DataFrame for easier manipulation
-    template_details_df = pd.DataFrame(list(template_count_dict.items()), columns=['template_ref', 'count'])
-
-    # Write the template_details DataFrame to the sheet
-    for r_idx, row in enumerate(dataframe_to_rows(template_details_df, index=False, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            template_sheet.cell(row=r_idx, column=c_idx, value=value)
-
-    # Save the updated workbook
-    new_file_path = '/Users/diegopereira/Documents/Development/git/serenity/CI-AdoptionPlan-Hosted_Builds_Migration_Updated.xlsx'
-    workbook.save(new_file_path)
-    print(f"Spreadsheet updated and saved to {new_file_path}")
-
+    import openpyxl
+    if input_path and os.path.exists(input_path):
+        # Keep the input workbook's own sheets and formatting; the generated sheets are dropped and
+        # recreated so rows left from an earlier, longer run do not survive
+        workbook = openpyxl.load_workbook(input_path)
+        positions = {name: workbook.sheetnames.index(name) for name in SPREADSHEET_SHEETS if name in workbook.sheetnames}
+        for name in positions:
+            del workbook[name]
+    else:
+        print("Spreadsheet not found. Creating a new one.")
+        # Write-only workbooks stream rows to disk as they are appended
+        workbook = openpyxl.Workbook(write_only=True)
+        positions = {}
+
+    for name, header, rows in spreadsheet_rows(org_summary, account_summary, pipeline_details, template_count_dict):
+        sheet = workbook.create_sheet(name, positions.get(name))
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+
+    workbook.save(output_path)
+    print(f"Spreadsheet updated and saved to {output_path}")
+
+def reset_clients():
+    # The HTTP client and caches are closed at the end of a run; the next run in the same process
+    # (serve mode) opens new ones
+    global _yaml_cache, _execution_cache
+    set_http_client(None)
+    with _http_client_lock:
+        _yaml_cache = None
+        _execution_cache = None
+
+def run_crawl(resume=False, shard=None, filters=None, record=None, replay=None, incremental=None):
+    # shard is (index, count, by); filters maps 'org', 'project' and 'pipeline' to glob lists.
+    # record/replay name a fixture archive (see mock_harness). incremental overrides INCREMENTAL.
+    mock = None
+    if record:
+        from mock_harness import FixtureRecorder
+        set_http_client(HarnessClient(recorder=FixtureRecorder(record)))
+    elif replay:
+        from mock_harness import MockHarness
+        mock = MockHarness(replay).start()
+        print(f'Replaying {len(mock.fixtures)} recorded responses from {replay}')
+        set_http_client(HarnessClient(base_url=mock.url))
+    project_build_times.clear()
+    metrics.reset()
+    completed = False
+    templates = TemplateResolver()
+    incremental = INCREMENTAL if incremental is None else incremental
+    state_path = scoped_path(PIPELINE_STATE_PATH, shard, filters)
+    previous_records = load_pipeline_state(state_path) if incremental else None
+    if previous_records is None and incremental and state_path != PIPELINE_STATE_PATH:
+        # A scope's first incremental run can still reuse the account-wide results
+        previous_records = load_pipeline_state(PIPELINE_STATE_PATH)
+    if incremental and previous_records is None:
+        print(f'No previous state at {state_path}, running a full crawl')
+    incremental = IncrementalState(previous_records, templates) if previous_records is not None else None
+    # The crawl engine only prefetches; DEBUG runs stay on the plain sequential path
+    store = ResultStore(resume=resume, shard=shard, filters=filters) if RESULT_STORE_PATH else None
+    journal = CrawlJournal(resume=resume, store=store) if CRAWL_JOURNAL_PATH else None
+    engine = CrawlEngine(incremental=incremental, templates=templates, journal=journal, shard=shard, filters=filters) if CRAWL_CONCURRENCY > 1 and not DEBUG else None
+    if incremental and engine:
+        incremental.prefetch_templates(engine)
+    set_result_store(store)
+    sink = ResultSink(state_path=state_path, store=store)
+    try:
+        crawl(engine, incremental, templates, sink, journal, shard, filters)
+        if TEMPLATE_GRAPH_PATH:
+            templates.write_graph(scoped_path(TEMPLATE_GRAPH_PATH, shard, filters))
+        if state_path != PIPELINE_STATE_PATH:
+            print(f'Scoped run: pipeline state, index and template graph written with the suffix {scope_suffix(shard, filters)}')
+        if journal:
+            journal.close()
+            if resume:
+                print(f'Resumed: {journal.stats}')
+                logging.info(f'Resumed crawl stats: {journal.stats}')
+        print(f'Templates: {templates.stats}')
+        logging.info(f'Template resolution stats: {templates.stats}')
+        if incremental:
+            print(f'Incremental run: {incremental.stats}')
+            logging.info(f'Incremental run stats: {incremental.stats}')
+        completed = True
+    finally:
+        if not sink.closed:
+            # Keep the rows written so far, but not a partial pipeline state
+            sink.close(completed=False)
+        if journal and not journal.file.closed:
+            journal.close(completed=False)
+            print(f'Crawl interrupted; rerun with --resume to continue from {journal.path}')
+        set_result_store(None)
+        if engine:
+            engine.close()
+        close_parse_pool()
+        client = get_http_client()
+        print(f'HTTP: {client.stats}, adapted rates: {client.rates()}')
+        logging.info(f'HTTP stats: {client.stats}, adapted rates: {client.rates()}, concurrency limit: {client.concurrency.limit:.1f}')
+        client.close()
+        if record:
+            print(f'Recorded {client.recorder.count} responses to {record}')
+        if mock:
+            print(f'Mock Harness: {mock.stats}')
+            logging.info(f'Mock Harness stats: {mock.stats}')
+            mock.close()
+        execution_cache = get_execution_cache()
+        if execution_cache:
+            print(f'Execution cache: {execution_cache.stats}')
+            logging.info(f'Execution cache stats: {execution_cache.stats}')
+            execution_cache.close()
+        cache = get_yaml_cache()
+        if cache:
+            print(f'YAML cache: {cache.stats}')
+            logging.info(f'YAML cache stats: {cache.stats}')
+            cache.close()
+        reset_clients()
+        metrics.write(
+            completed=completed,
+            shard=list(shard) if shard else None,
+            filters=filters,
+            http=dict(client.stats, rates=client.rates()),
+            templates=templates.stats,
+            incremental=incremental.stats if incremental else None,
+            journal=journal.stats if journal else None,
+            yaml_cache=cache.stats if cache else None,
+            execution_cache=execution_cache.stats if execution_cache else None
+        )
+        if METRICS_REPORT_PATH:
+            print(f'Run report written to {METRICS_REPORT_PATH}')
+
+def in_filters(filters, org_identifier, project_identifier=None, pipeline_identifier=None):
+    # A level without globs matches everything; identifiers not known yet are not checked
+    if not filters:
+        return True
+    for level, identifier in (('org', org_identifier), ('project', project_identifier), ('pipeline', pipeline_identifier)):
+        patterns = filters.get(level)
+        if patterns and identifier is not None and not any(fnmatch.fnmatchcase(identifier, pattern) for pattern in patterns):
+            return False
+    return True
+
+def in_shard(shard, org_identifier, project_identifier=None):
+    # shard is (index, count, by); units hash stably, so every shard agrees on the split
+    if shard is None:
+        return True
+    index, count, by = shard
+    if by == 'project' and project_identifier is None:
+        return True
+    unit = org_identifier if by == 'org' else f'{org_identifier}/{project_identifier}'
+    return int(hashlib.sha1(unit.encode()).hexdigest(), 16) % count == index
+
+def scope_suffix(shard=None, filters=None):
+    # '' for an account-wide run; otherwise names the shard and (by a short hash) the filters
+    parts = []
+    if shard:
+        index, count, by = shard
+        parts.append(f'shard-{by}-{index}-of-{count}')
+    if filters:
+        parts.append('scope-' + hashlib.sha1(json.dumps(filters, sort_keys=True).encode()).hexdigest()[:8])
+    return '.'.join(parts)
+
+def scoped_path(path, shard=None, filters=None):
+    # pipeline_state.json -> pipeline_state.shard-org-0-of-4.json for a scoped run
+    suffix = scope_suffix(shard, filters)
+    if not path or not suffix:
+        return path
+    root, extension = os.path.splitext(path)
+    return f'{root}.{suffix}{extension}'
+
+def new_org_partial():
+    # Raw totals of one org, as opposed to its summary: partials of the same org from different
+    # shards add up, and the percentages and build time figures are only derived at the end
+    return {
+        'total_projects': 0,
+        'total_pipelines': 0,
+        'total_pipelines_with_ci': 0,
+        'total_ci_stages': 0,
+        'template_count': defaultdict(int),
+        'infra_types': defaultdict(int),
+        'build_times': BuildTimeStats()
+    }
 
+def add_project_to_partial(partial, records, template_count_dict):
+    # records can be a stream; template_count_dict is read once it is exhausted
+    partial['total_projects'] += 1
+    total_pipelines = partial['total_pipelines']
+    for record in records:
+        partial['total_pipelines'] += 1
+        partial['total_pipelines_with_ci'] += record.pipelines_with_ci
+        partial['total_ci_stages'] += record.ci_stages
+        partial['build_times'].merge(record.build_times)
+        for infra_type in record.infra_types:
+            partial['infra_types'][infra_type] += 1
+    if partial['total_pipelines'] > total_pipelines:
+        for template_ref, count in template_count_dict.items():
+            partial['template_count'][template_ref] += count
+
+def merge_org_partials(partial, other):
+    for field in ('total_projects', 'total_pipelines', 'total_pipelines_with_ci', 'total_ci_stages'):
+        partial[field] += other[field]
+    for field in ('template_count', 'infra_types'):
+        for key, count in other[field].items():
+            partial[field][key] += count
+    partial['build_times'].merge(other['build_times'])
+    return partial
+
+def partial_to_dict(partial):
+    return dict(partial, template_count=dict(partial['template_count']), infra_types=dict(partial['infra_types']), build_times=partial['build_times'].to_dict())
+
+def partial_from_dict(data):
+    partial = new_org_partial()
+    partial.update({field: data[field] for field in ('total_projects', 'total_pipelines', 'total_pipelines_with_ci', 'total_ci_stages')})
+    partial['template_count'].update(data['template_count'])
+    partial['infra_types'].update(data['infra_types'])
+    partial['build_times'] = BuildTimeStats.from_dict(data['build_times'])
+    return partial
+
+def partial_summary(partial):
+    return {
+        'total_pipelines': partial['total_pipelines'],
+        'total_pipelines_with_ci': partial['total_pipelines_with_ci'],
+        'total_ci_stages': partial['total_ci_stages'],
+        'template_count': dict(partial['template_count']),
+        'infra_percentage': calculate_percentage(partial['infra_types'], partial['total_pipelines_with_ci']),
+        **partial['build_times'].fields()
+    }
 
-def main():
-    orgs = get_orgs()
-    total_orgs = len(orgs)
-    total_projects = 0
-    total_pipelines = 0
-    total_pipelines_with_ci = 0
-    total_ci_stages = 0
-    template_count = defaultdict(int)
-    infra_types_account = defaultdict(int)
+def summarize_partials(org_partials):
+    # org_summary and account_summary from per-org partials, in org crawl order
     org_summary = {}
-    pipeline_details = []
-    pipeline_errors = []
-    processed_templates = {}
-    template_count_dict = defaultdict(int)
-    avg_build_times_account = []
-    max_build_times_account = []
-
-    for org in orgs:
-        org_identifier = org['organization']['identifier']
-        print(f'Processing org: {org_identifier}')
-        projects = get_projects(org_identifier)
-        total_projects += len(projects)
-
-        infra_types_org = defaultdict(int)
-        ci_stage_count_org = 0
-        total_ci_stages_org = 0
-        template_count_org = defaultdict(int)
-        total_pipelines_org = 0
-        avg_build_times_org = []
-        max_build_times_org = []
-
-        for project in projects:
-            project_identifier = project['projectResponse']['project']['identifier']
-            org_identifier = project['projectResponse']['project']['orgIdentifier']
-            print(f'Processing project: {project_identifier} in org: {org_identifier}')
-            pipelines = get_pipelines(org_identifier, project_identifier)
-            if pipelines:
-                total_pipelines_org += len(pipelines)
-                total_pipelines_project, ci_pipelines_count, total_stages, infra_types, template_count_local, details, errors, avg_build_time, max_build_time = analyze_pipelines(
-                    pipelines, org_identifier, project_identifier, processed_templates, template_count_dict
-                )
-                total_pipelines += total_pipelines_project
-                total_pipelines_with_ci += ci_pipelines_count
-                total_ci_stages += total_stages
-
-                avg_build_times_org.append(avg_build_time)
-                max_build_times_org.append(max_build_time)
-                for template_ref, count in template_count_local.items():
-                    template_count[template_ref] += count
-                ci_stage_count_org += ci_pipelines_count
-                total_ci_stages_org += total_stages
-                for template_ref, count in template_count_local.items():
-                    template_count_org[template_ref] += count
-                for infra_type, count in infra_types.items():
-                    infra_types_org[infra_type] += count
-                pipeline_details.extend(details)
-                pipeline_errors.extend(errors)
-
-        infra_percentage_org = calculate_percentage(infra_types_org, ci_stage_count_org)
-        avg_build_time_org = sum(avg_build_times_org) / len(avg_build_times_org) if avg_build_times_org else 0
-        max_build_time_org = max(max_build_times_org) if max_build_times_org else 0
-        org_summary[org_identifier] = {
-            'total_pipelines': total_pipelines_org,
-            'total_pipelines_with_ci': ci_stage_count_org,
-            'total_ci_stages': total_ci_stages_org,
-            'template_count': dict(template_count_org),
-            'infra_percentage': infra_percentage_org,
-            'avg_build_time': avg_build_time_org,
-            'max_build_time': max_build_time_org
-        }
-
-        avg_build_times_account.append(avg_build_time_org)
-        max_build_times_account.append(max_build_time_org)
-
-        for infra_type, count in infra_types_org.items():
-            infra_types_account[infra_type] += count
+    account = new_org_partial()
+    for org_identifier, partial in org_partials.items():
+        org_summary[org_identifier] = partial_summary(partial)
+        merge_org_partials(account, partial)
+    account_summary = {
+        'total_orgs': len(org_partials),
+        'total_projects': account['total_projects'],
+        'total_pipelines': account['total_pipelines'],
+        'total_pipelines_with_ci': account['total_pipelines_with_ci'],
+        'total_ci_stages': account['total_ci_stages'],
+        'template_count': dict(account['template_count']),
+        'infra_percentage': calculate_percentage(account['infra_types'], account['total_pipelines_with_ci']),
+        **account['build_times'].fields()
+    }
+    return org_summary, account_summary
 
-    infra_percentage_account = calculate_percentage(infra_types_account, total_pipelines_with_ci)
+def print_summaries(org_summary, account_summary):
+    total_orgs, total_projects, total_pipelines = account_summary['total_orgs'], account_summary['total_projects'], account_summary['total_pipelines']
     avg_pipelines_per_project = total_pipelines / total_projects if total_projects > 0 else 0
     avg_projects_per_org = total_projects / total_orgs if total_orgs > 0 else 0
-    total_account_avg_build_time = sum(avg_build_times_account) / len(avg_build_times_account) if avg_build_times_account else 0
-    total_account_max_build_time = max(max_build_times_account) if max_build_times_account else 0
-
-    account_summary = {
-        'total_orgs': total_orgs,
-        'total_projects': total_projects,
-        'total_pipelines': total_pipelines,
-        'total_pipelines_with_ci': total_pipelines_with_ci,
-        'total_ci_stages': total_ci_stages,
-        'template_count': dict(template_count),
-        'infra_percentage': infra_percentage_account,
-        'avg_build_time': total_account_avg_build_time,
-        'max_build_time': total_account_max_build_time
-    }
 
     print(f'Total Organizations: {total_orgs}')
     print(f'Total Projects: {total_projects}')
     print(f'Total Pipelines: {total_pipelines}')
-    print(f'Pipelines with CI Stage: {total_pipelines_with_ci}')
-    print(f'Total CI Stages: {total_ci_stages}')
-    print(f'Templates in Pipelines: {sum(template_count.values())}')
+    print(f'Pipelines with CI Stage: {account_summary["total_pipelines_with_ci"]}')
+    print(f'Total CI Stages: {account_summary["total_ci_stages"]}')
+    print(f'Templates in Pipelines: {sum(account_summary["template_count"].values())}')
     print(f'Average Pipelines per Project: {avg_pipelines_per_project:.2f}')
     print(f'Average Projects per Organization: {avg_projects_per_org:.2f}')
-    print(f'Total Account Average Build Time: {total_account_avg_build_time}')
-    print(f'Total Account Max Build Time: {total_account_max_build_time}')
+    print(f'Total Account Average Build Time: {account_summary["avg_build_time"]}')
+    print(f'Total Account Max Build Time: {account_summary["max_build_time"]}')
+    print(f'Total Account P50/P90/P99 Build Time: {account_summary["p50_build_time"]}/{account_summary["p90_build_time"]}/{account_summary["p99_build_time"]}')
     print(f'\nInfrastructure types for account:')
-    for infra_type, percentage in infra_percentage_account.items():
+    for infra_type, percentage in account_summary['infra_percentage'].items():
         print(f'{infra_type}: {percentage}')
 
     print('\nInfrastructure types by org:')
@@ -740,11 +3115,203 @@ def main():
         for infra_type, percentage in summary['infra_percentage'].items():
             print(f'{infra_type}: {percentage}')
 
+def stream_records(records, sink, index, pipeline_identifiers):
+    # Each record goes to the sink and the index as soon as it is analyzed, so a project's rows
+    # are never held together and a crash keeps every row written before it
+    for record in records:
+        with metrics.timer('phase_seconds', phase='export'):
+            sink.add([record])
+            if index:
+                index.add([record])
+        pipeline_identifiers.append(record.pipeline_identifier)
+        yield record
+
+def crawl(engine=None, incremental=None, templates=None, sink=None, journal=None, shard=None, filters=None):
+    if templates is None:
+        templates = engine.templates if engine else TemplateResolver()
+    # Pipeline rows go straight to disk; only the running org totals stay in memory
+    if sink is None:
+        sink = ResultSink(state_path=scoped_path(PIPELINE_STATE_PATH, shard, filters))
+    index_path = scoped_path(PIPELINE_INDEX_PATH, shard, filters)
+    all_orgs = get_orgs()
+    orgs = [org for org in all_orgs if in_shard(shard, org['organization']['identifier']) and in_filters(filters, org['organization']['identifier'])]
+    if engine:
+        engine.start(orgs)
+    org_partials = {}
+    project_order = {}
+    crawled_projects = {}
+    template_count_dict = defaultdict(int)
+    index = PipelineIndex() if index_path else None
+
+    for org in orgs:
+        org_identifier = org['organization']['identifier']
+        print(f'Processing org: {org_identifier}')
+        projects = engine.get_projects(org_identifier) if engine else get_projects(org_identifier)
+        partial = org_partials[org_identifier] = new_org_partial()
+        project_order[org_identifier] = [project['projectResponse']['project']['identifier'] for project in projects]
+        org_projects = crawled_projects[org_identifier] = []
+
+        for project in projects:
+            project_identifier = project['projectResponse']['project']['identifier']
+            org_identifier = project['projectResponse']['project']['orgIdentifier']
+            if not in_shard(shard, org_identifier, project_identifier) or not in_filters(filters, org_identifier, project_identifier):
+                continue
+            print(f'Processing project: {project_identifier} in org: {org_identifier}')
+            org_projects.append(project_identifier)
+            records = journal.project_records(org_identifier, project_identifier) if journal else None
+            if records is None:
+                # Pipelines are streamed page by page, so analysis starts while later pages are still in flight
+                pipelines = engine.get_pipelines(org_identifier, project_identifier) if engine else iter_pipelines(org_identifier, project_identifier)
+                if filters and filters.get('pipeline'):
+                    pipelines = [pipeline for pipeline in pipelines or [] if in_filters(filters, org_identifier, project_identifier, pipeline['identifier'])]
+                records = analyze_project(pipelines, org_identifier, project_identifier, templates, template_count_dict, engine=engine, incremental=incremental, journal=journal)
+            pipeline_identifiers = []
+            add_project_to_partial(partial, stream_records(records, sink, index, pipeline_identifiers), template_count_dict)
+            if journal and not journal.project_done(org_identifier, project_identifier):
+                journal.finish_project(org_identifier, project_identifier, pipeline_identifiers)
+
+    org_summary, account_summary = summarize_partials(org_partials)
+    print_summaries(org_summary, account_summary)
+
+    with metrics.timer('phase_seconds', phase='export'):
+        sink.close(projects=crawled_projects)
+        if index:
+            index.add_template_edges(templates, load_pipeline_index(index_path))
+            index.write(index_path)
+        if shard:
+            save_shard_partial(SHARD_PARTIAL_PATH, shard, [org['organization']['identifier'] for org in all_orgs], project_order, org_partials, template_count_dict, filters)
+        export_to_csv(org_summary, account_summary)
+        export_template_details_to_csv(template_count_dict)
+    with metrics.timer('phase_seconds', phase='spreadsheet'):
+        update_spreadsheet(org_summary, account_summary, read_pipeline_details(sink.details_path), template_count_dict)
+
+def save_shard_partial(path, shard, org_order, project_order, org_partials, template_count_dict, filters=None):
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as partial_file:
+        json.dump({
+            'shard': list(shard),
+            'filters': filters,
+            'org_order': org_order,
+            'project_order': project_order,
+            'orgs': {org_identifier: partial_to_dict(partial) for org_identifier, partial in org_partials.items()},
+            'template_count': dict(template_count_dict)
+        }, partial_file)
+    os.replace(temp_path, path)
+
+def load_shard_partials(shard_dirs):
+    shards = []
+    for shard_dir in shard_dirs:
+        with open(os.path.join(shard_dir, SHARD_PARTIAL_PATH)) as partial_file:
+            shards.append(json.load(partial_file))
+    counts = {tuple(shard['shard'][1:]) for shard in shards}
+    if len(counts) != 1:
+        raise ValueError(f'Shards were split differently: {sorted(counts)}')
+    count = shards[0]['shard'][1]
+    indexes = sorted(shard['shard'][0] for shard in shards)
+    if indexes != list(range(count)):
+        raise ValueError(f'Expected shards 0 to {count - 1} once each, got {indexes}')
+    return shards
+
+def merge_shard_csv(shard_dirs, file_name, fieldnames, sort_key):
+    # Each shard's rows are already in crawl order, so a streaming k-way merge restores the order
+    # of a single run without loading any shard in memory
+    files = [open(os.path.join(shard_dir, file_name), newline='') for shard_dir in shard_dirs]
+    temp_path = f'{file_name}.tmp'
+    try:
+        with open(temp_path, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in heapq.merge(*(csv.DictReader(shard_file) for shard_file in files), key=sort_key):
+                writer.writerow(row)
+    finally:
+        for shard_file in files:
+            shard_file.close()
+    os.replace(temp_path, file_name)
+
+def merge_shards(shard_dirs):
+    shards = load_shard_partials(shard_dirs)
+    org_order = shards[0]['org_order']
+    org_index = {org_identifier: index for index, org_identifier in enumerate(org_order)}
+    project_index = {}
+    for shard in shards:
+        for org_identifier, project_identifiers in shard['project_order'].items():
+            for index, project_identifier in enumerate(project_identifiers):
+                project_index[(org_identifier, project_identifier)] = index
+
+    org_partials = {}
+    template_count_dict = defaultdict(int)
+    for shard in shards:
+        for org_identifier, data in shard['orgs'].items():
+            org_partials.setdefault(org_identifier, new_org_partial())
+            merge_org_partials(org_partials[org_identifier], partial_from_dict(data))
+        for template_ref, count in shard['template_count'].items():
+            template_count_dict[template_ref] += count
+    org_partials = dict(sorted(org_partials.items(), key=lambda item: org_index.get(item[0], len(org_index))))
+
+    def crawl_order(row):
+        return org_index.get(row['org_identifier'], len(org_index)), project_index.get((row['org_identifier'], row['project_identifier']), 0)
+
+    merge_shard_csv(shard_dirs, 'pipeline_details.csv', PIPELINE_DETAIL_FIELDS, crawl_order)
+    merge_shard_csv(shard_dirs, 'pipeline_errors.csv', PIPELINE_ERROR_FIELDS, crawl_order)
+    if PIPELINE_INDEX_PATH:
+        index = PipelineIndex()
+        for shard_dir, shard in zip(shard_dirs, shards):
+            shard_index = load_pipeline_index(os.path.join(shard_dir, scoped_path(PIPELINE_INDEX_PATH, tuple(shard['shard']), shard.get('filters'))))
+            if shard_index:
+                index.merge(shard_index)
+        index.write(PIPELINE_INDEX_PATH)
+
+    org_summary, account_summary = summarize_partials(org_partials)
+    print_summaries(org_summary, account_summary)
     export_to_csv(org_summary, account_summary)
-    export_pipeline_details_to_csv(pipeline_details)
-    export_pipeline_errors_to_csv(pipeline_errors)
     export_template_details_to_csv(template_count_dict)
-    update_spreadsheet(org_summary, account_summary, pipeline_details, template_count_dict)
-
-if __name__ == "__main__":
-    main()
+    update_spreadsheet(org_summary, account_summary, read_pipeline_details(), template_count_dict)
+    print(f'Merged {len(shards)} shards: {", ".join(shard_dirs)}')
+    logging.info(f'Merged {len(shards)} shards: {shard_dirs}')
+
+def group_state_records(records, projects=None):
+    # {org: {project: records}} in crawl order, with the orgs and projects without pipelines from the
+    # state's projects. States written without it only know the projects that have pipelines.
+    grouped = {org_identifier: {project_identifier: [] for project_identifier in project_identifiers} for org_identifier, project_identifiers in (projects or {}).items()}
+    for record in records:
+        grouped.setdefault(record.org_identifier, {}).setdefault(record.project_identifier, []).append(record)
+    return grouped
+
+def records_to_partials(records, projects=None):
+    # Per-org partials rebuilt from stored pipeline records, as the crawl built them
+    org_partials = {}
+    for org_identifier, org_projects in group_state_records(records, projects).items():
+        partial = org_partials[org_identifier] = new_org_partial()
+        for project_records in org_projects.values():
+            add_project_to_partial(partial, project_records, {})
+    return org_partials
+
+def load_state_records(state_path=PIPELINE_STATE_PATH):
+    # (records, projects) of the last completed run, see read_pipeline_state
+    state = read_pipeline_state(state_path)
+    if state is None:
+        raise FileNotFoundError(f'No pipeline state at {state_path}; run a crawl first')
+    return state
+
+def summarize_results(state_path=PIPELINE_STATE_PATH):
+    org_summary, account_summary = summarize_partials(records_to_partials(*load_state_records(state_path)))
+    print_summaries(org_summary, account_summary)
+    return org_summary, account_summary
+
+def export_results(state_path=PIPELINE_STATE_PATH, spreadsheet=True):
+    # Rewrites the CSVs (and the spreadsheet) from the last completed run's pipeline state, without
+    # calling the API
+    records, projects = load_state_records(state_path)
+    org_summary, account_summary = summarize_partials(records_to_partials(records, projects))
+    export_to_csv(org_summary, account_summary)
+    export_pipeline_details_to_csv([record.detail_row() for record in records if record.analyzed])
+    export_pipeline_errors_to_csv([record.error_row() for record in records if record.error is not None])
+    export_template_details_to_csv({})
+    if PIPELINE_INDEX_PATH:
+        index = PipelineIndex()
+        index.add(records)
+        index.add_template_edges(TemplateResolver(), load_pipeline_index(PIPELINE_INDEX_PATH))
+        index.write(PIPELINE_INDEX_PATH)
+    if spreadsheet:
+        update_spreadsheet(org_summary, account_summary, read_pipeline_details(), {})
+    print(f'Exported {len(records)} pipelines from {state_path}')
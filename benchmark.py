@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+from mock_harness import MockHarness
+
+# End-to-end benchmark: runs the full analyzer against MockHarness serving a recorded fixture
+# archive, each run in a fresh directory so every cache starts cold, and reports wall time,
+# requests per second and peak RSS.
+ANALYZER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline_analyzer.py')
+
+def run_analyzer(mock, env, keep_dir=None):
+    workdir = tempfile.mkdtemp(prefix='pipeline_analyzer_bench_')
+    run_env = dict(os.environ, HARNESS_BASE_URL=mock.url, **env)
+    run_env.setdefault('API_KEY', 'benchmark')
+    run_env.setdefault('HARNESS_ACCOUNT_ID', 'benchmark')
+    requests_before = mock.stats['requests']
+    try:
+        with open(os.path.join(workdir, 'analyzer_output.log'), 'w') as output:
+            start_time = time.monotonic()
+            process = subprocess.Popen([sys.executable, ANALYZER_PATH], cwd=workdir, env=run_env, stdout=output, stderr=subprocess.STDOUT)
+            # wait4 reports the resource usage of this run alone, parse workers included
+            _, status, usage = os.wait4(process.pid, 0)
+            wall_time = time.monotonic() - start_time
+        process.returncode = os.waitstatus_to_exitcode(status)
+        requests = mock.stats['requests'] - requests_before
+        report_path = os.path.join(workdir, run_env.get('METRICS_REPORT_PATH', 'run_report.json'))
+        report = None
+        if os.path.exists(report_path):
+            with open(report_path) as file:
+                report = json.load(file)
+        return {
+            'exit_code': process.returncode,
+            'wall_seconds': round(wall_time, 3),
+            'requests': requests,
+            'requests_per_second': round(requests / wall_time, 1) if wall_time else None,
+            'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+            'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 3),
+            'completed': report.get('completed') if report else None
+        }
+    finally:
+        if keep_dir:
+            shutil.copytree(workdir, keep_dir, dirs_exist_ok=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def summarize(results):
+    summary = {}
+    for field in ('wall_seconds', 'requests_per_second', 'peak_rss_mb', 'cpu_seconds'):
+        values = [result[field] for result in results if result[field] is not None]
+        if values:
+            summary[field] = {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+    return summary
+
+def parse_env(value):
+    if '=' not in value:
+        raise argparse.ArgumentTypeError(f'expected KEY=VALUE, got {value!r}')
+    return tuple(value.split('=', 1))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark a full analyzer run against a recorded fixture archive.')
+    parser.add_argument('fixtures', help='fixture archive recorded with `analyzer.py --record`')
+    parser.add_argument('--runs', type=int, default=3, help='number of runs (default: 3)')
+    parser.add_argument('--env', type=parse_env, action='append', default=[], metavar='KEY=VALUE', help='analyzer setting for every run, e.g. CRAWL_CONCURRENCY=32')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the mock server adds to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with injected 429s')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the injected latency and faults')
+    parser.add_argument('--keep', metavar='DIR', help="copy the last run's outputs to DIR")
+    parser.add_argument('--output', metavar='FILE', help='also write the results as JSON to FILE')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = dict(args.env)
+    results = []
+    with MockHarness(args.fixtures, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                     throttle_rate=args.throttle_rate, retry_after=args.retry_after, seed=args.seed) as mock:
+        print(f'Serving {len(mock.fixtures)} recorded responses at {mock.url}')
+        for run in range(args.runs):
+            result = run_analyzer(mock, env, keep_dir=args.keep if run == args.runs - 1 else None)
+            results.append(result)
+            print(f'Run {run + 1}/{args.runs}: {result}')
+        server_stats = dict(mock.stats)
+    summary = summarize(results)
+    print(f'Mock Harness: {server_stats}')
+    for field, values in summary.items():
+        print(f'{field}: median {values["median"]}, min {values["min"]}, max {values["max"]}')
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'env': env, 'runs': results, 'summary': summary, 'server': server_stats}, file, indent=2)
+    if any(result['exit_code'] for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
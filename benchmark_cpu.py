@@ -0,0 +1,214 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+import contextlib
+from concurrent.futures import Future
+from synthetic_account import generate_account
+
+# CPU micro-benchmarks: drives the analysis, build time, summary, CSV and spreadsheet functions
+# on a synthetic account, with no network involved, and reports time and memory allocated per
+# case. With --baseline, cases that got slower than a previous --output by more than --tolerance
+# fail the run.
+
+class SyntheticEngine:
+    # Stands in for CrawlEngine once everything is prefetched: analyze_pipelines gets parsed
+    # pipelines and build times straight from memory
+    def __init__(self, documents, build_times):
+        self.documents = documents
+        self.build_times = build_times
+
+    def consume(self, org_identifier, project_identifier, pipeline_identifier):
+        pass
+
+    def get_pipeline_yaml(self, org_identifier, project_identifier, pipeline_identifier, store_type, connector_ref=None, repo_name=None, last_updated=None):
+        return self.documents[(org_identifier, project_identifier, pipeline_identifier)], None
+
+    def get_build_time_stats(self, org_identifier, project_identifier, pipeline_identifier):
+        return self.build_times[(org_identifier, project_identifier, pipeline_identifier)]
+
+def loaded_templates(analyzer, parsed_templates):
+    # A TemplateResolver whose fetches are already done, so resolution only analyzes
+    templates = analyzer.TemplateResolver()
+    for key, template_yaml in parsed_templates.items():
+        future = Future()
+        future.set_result((template_yaml, None))
+        templates.fetches[key] = future
+    return templates
+
+def prepare(analyzer, account):
+    data = {'account': account}
+    data['documents'] = {key: analyzer.parse_yaml_document(raw_yaml, 'pipeline')[0] for key, raw_yaml in account['pipeline_yaml'].items()}
+    data['templates'] = {key: analyzer.parse_yaml_document(raw_yaml, 'template')[0] for key, raw_yaml in account['templates'].items()}
+    data['build_times'] = {key: analyzer.calculate_build_times(executions) for key, executions in account['executions'].items()}
+    engine = SyntheticEngine(data['documents'], data['build_times'])
+    templates = loaded_templates(analyzer, data['templates'])
+    template_count = {}
+    org_partials = {}
+    details = []
+    for org_identifier, project_identifiers in account['projects'].items():
+        partial = org_partials[org_identifier] = analyzer.new_org_partial()
+        for project_identifier in project_identifiers:
+            pipelines = account['pipelines'][(org_identifier, project_identifier)]
+            records = list(analyzer.analyze_project(pipelines, org_identifier, project_identifier, templates, template_count, engine=engine))
+            analyzer.add_project_to_partial(partial, records, template_count)
+            details.extend(record.detail_row() for record in records if record.analyzed)
+    data['engine'] = engine
+    data['org_partials'] = org_partials
+    data['details'] = details
+    data['template_count'] = {f'template_{index}': index for index in range(len(account['templates']))}
+    data['org_summary'], data['account_summary'] = analyzer.summarize_partials(org_partials)
+    return data
+
+def cases(analyzer, data, workdir):
+    account = data['account']
+
+    def process_stages():
+        templates = loaded_templates(analyzer, data['templates'])
+        for (org_identifier, project_identifier, pipeline_identifier), document in data['documents'].items():
+            analyzer.process_stages(document['pipeline']['stages'], templates, {}, 'project', org_identifier, project_identifier, pipeline_identifier)
+
+    def analyze_pipelines():
+        templates = loaded_templates(analyzer, data['templates'])
+        for (org_identifier, project_identifier), pipelines in account['pipelines'].items():
+            analyzer.analyze_pipelines(pipelines, org_identifier, project_identifier, templates, {}, engine=data['engine'])
+
+    def calculate_build_times():
+        for executions in account['executions'].values():
+            analyzer.calculate_build_times(executions)
+
+    def calculate_percentage():
+        for partial in data['org_partials'].values():
+            for _ in range(100):
+                analyzer.calculate_percentage(partial['infra_types'], partial['total_pipelines_with_ci'])
+
+    def summarize_partials():
+        analyzer.summarize_partials(data['org_partials'])
+
+    def export_to_csv():
+        analyzer.export_to_csv(data['org_summary'], data['account_summary'])
+
+    def export_pipeline_details_to_csv():
+        analyzer.export_pipeline_details_to_csv(data['details'])
+
+    def export_template_details_to_csv():
+        analyzer.export_template_details_to_csv(data['template_count'])
+
+    def update_spreadsheet_new():
+        analyzer.update_spreadsheet(data['org_summary'], data['account_summary'], data['details'], data['template_count'],
+                                    input_path=os.path.join(workdir, 'missing.xlsx'), output_path=os.path.join(workdir, 'new.xlsx'))
+
+    def update_spreadsheet_existing():
+        # Replaces the generated sheets of the workbook the previous case wrote
+        analyzer.update_spreadsheet(data['org_summary'], data['account_summary'], data['details'], data['template_count'],
+                                    input_path=os.path.join(workdir, 'new.xlsx'), output_path=os.path.join(workdir, 'updated.xlsx'))
+
+    return {
+        'process_stages': process_stages,
+        'analyze_pipelines': analyze_pipelines,
+        'calculate_build_times': calculate_build_times,
+        'calculate_percentage': calculate_percentage,
+        'summarize_partials': summarize_partials,
+        'export_to_csv': export_to_csv,
+        'export_pipeline_details_to_csv': export_pipeline_details_to_csv,
+        'export_template_details_to_csv': export_template_details_to_csv,
+        'update_spreadsheet_new': update_spreadsheet_new,
+        'update_spreadsheet_existing': update_spreadsheet_existing
+    }
+
+def measure(func, repeat):
+    # Timed runs first, then one run under tracemalloc, which slows allocation down
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start_time)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        func()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    allocations = [stat for stat in after.compare_to(before, 'filename') if stat.count_diff > 0]
+    return {
+        'median_seconds': round(statistics.median(times), 6),
+        'min_seconds': round(min(times), 6),
+        'peak_kb': round(peak / 1024, 1),
+        'retained_kb': round(sum(stat.size_diff for stat in allocations) / 1024, 1),
+        'retained_blocks': sum(stat.count_diff for stat in allocations)
+    }
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get('cases', {}).get(name)
+        if previous and result['median_seconds'] > previous['median_seconds'] * (1 + tolerance):
+            regressions.append(f'{name}: {previous["median_seconds"]:.4f}s -> {result["median_seconds"]:.4f}s')
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Time the CPU-side analyzer functions on a synthetic account.')
+    parser.add_argument('--orgs', type=int, default=3)
+    parser.add_argument('--projects', type=int, default=5, help='projects per org')
+    parser.add_argument('--pipelines', type=int, default=20, help='pipelines per project')
+    parser.add_argument('--stages', type=int, default=8, help='top-level stages per pipeline')
+    parser.add_argument('--parallel-depth', type=int, default=3, help='nesting depth of parallel stage blocks')
+    parser.add_argument('--template-depth', type=int, default=4, help='length of the template chains')
+    parser.add_argument('--executions', type=int, default=20, help='executions per pipeline')
+    parser.add_argument('--nodes', type=int, default=30, help='layoutNodeMap entries per execution')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case (default: 5)')
+    parser.add_argument('--case', action='append', dest='cases', metavar='NAME', help='run only this case (repeatable)')
+    parser.add_argument('--output', metavar='FILE', help='write the results as JSON to FILE')
+    parser.add_argument('--baseline', metavar='FILE', help='fail if a case is slower than in this earlier --output')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline (default: 0.2 = 20%%)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    account = generate_account(args.orgs, args.projects, args.pipelines, args.stages, args.parallel_depth,
+                               args.template_depth, args.executions, args.nodes, seed=args.seed)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    output_path = os.path.abspath(args.output) if args.output else None
+    cwd = os.getcwd()
+    results = {}
+    # The analyzer writes its log and CSVs to the working directory
+    with tempfile.TemporaryDirectory(prefix='pipeline_analyzer_cpu_') as workdir:
+        os.chdir(workdir)
+        try:
+            import analyzer
+            with contextlib.redirect_stdout(io.StringIO()):
+                data = prepare(analyzer, account)
+            print(f'Account: {len(account["orgs"])} orgs, {len(account["pipeline_yaml"])} pipelines, {len(account["templates"])} templates, '
+                  f'{sum(len(executions) for executions in account["executions"].values())} executions')
+            for name, func in cases(analyzer, data, workdir).items():
+                if args.cases and name not in args.cases:
+                    continue
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = measure(func, args.repeat)
+                results[name] = result
+                print(f'{name:32} {result["median_seconds"] * 1000:10.2f} ms  (min {result["min_seconds"] * 1000:.2f} ms)  peak {result["peak_kb"]:.0f} KiB  retained {result["retained_kb"]:.0f} KiB')
+        finally:
+            os.chdir(cwd)
+    if output_path:
+        with open(output_path, 'w') as file:
+            json.dump({'args': vars(args), 'cases': results}, file, indent=2)
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import json
+import gzip
+import random
+import threading
+import time
+import logging
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# Fixture archives are gzip-compressed JSON lines, one API response per line, written by
+# `analyzer.py --record` and served back by MockHarness. Requests are matched on method, path,
+# query and JSON body. The account identifiers and the execution time window are left out of
+# the match, so an archive replays under any account and on any day.
+VOLATILE_PARAMS = {'accountIdentifier', 'routingId'}
+VOLATILE_BODY_FIELDS = {'timeRange'}
+
+def fixture_key(method, path, query, body=None):
+    params = sorted((name, value) for name, value in parse_qsl(query, keep_blank_values=True) if name not in VOLATILE_PARAMS)
+    if isinstance(body, dict):
+        body = {name: value for name, value in body.items() if name not in VOLATILE_BODY_FIELDS}
+    return method.upper(), path, urlencode(params), json.dumps(body, sort_keys=True)
+
+class FixtureRecorder:
+    # Appends responses to a fixture archive; shared by every crawl thread
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def record(self, method, url, body, response):
+        # url is relative to the client's base URL, e.g. /gateway/ng/api/organizations?...
+        parts = urlsplit(url)
+        line = json.dumps({
+            'method': method.upper(),
+            'path': parts.path,
+            'query': parts.query,
+            'body': body,
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type', 'application/json'),
+            'retry_after': response.headers.get('Retry-After'),
+            'text': response.text
+        })
+        with self.lock:
+            self.file.write(line + '\n')
+            self.count += 1
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def load_fixtures(path):
+    # Later responses to the same request replace earlier ones. An archive cut short by a killed
+    # run still loads everything before the cut.
+    fixtures = {}
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    fixture = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                fixtures[fixture_key(fixture['method'], fixture['path'], fixture['query'], fixture['body'])] = fixture
+    except EOFError:
+        logging.warning(f'Fixture archive {path} is truncated; loaded {len(fixtures)} responses')
+    return fixtures
+
+class MockHarness:
+    # Local HTTP stand-in for the Harness API that serves a fixture archive. Latency, 5xx errors
+    # and 429s can be injected to exercise the client's pacing and retries.
+    def __init__(self, fixtures, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1, seed=None):
+        self.fixtures = load_fixtures(fixtures) if isinstance(fixtures, str) else fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'served': 0, 'misses': 0, 'errors': 0, 'throttled': 0}
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                mock.handle(self)
+
+            def do_POST(self):
+                mock.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def fault(self):
+        with self.lock:
+            roll = self.random.random()
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if roll < self.throttle_rate:
+            return delay, 429
+        if roll < self.throttle_rate + self.error_rate:
+            return delay, 503
+        return delay, None
+
+    def handle(self, request):
+        length = int(request.headers.get('Content-Length') or 0)
+        raw_body = request.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw_body) if raw_body else None
+        except ValueError:
+            body = raw_body.decode('utf-8', 'replace')
+        self.count('requests')
+        delay, status = self.fault()
+        if delay:
+            time.sleep(delay)
+        parts = urlsplit(request.path)
+        fixture = self.fixtures.get(fixture_key(request.command, parts.path, parts.query, body))
+        headers = {}
+        if status == 429:
+            self.count('throttled')
+            headers['Retry-After'] = str(self.retry_after)
+            text = json.dumps({'status': 'ERROR', 'code': 'TOO_MANY_REQUESTS', 'message': 'Injected throttle'})
+        elif status == 503:
+            self.count('errors')
+            text = json.dumps({'status': 'ERROR', 'code': 'SERVICE_UNAVAILABLE', 'message': 'Injected error'})
+        elif fixture is None:
+            self.count('misses')
+            logging.warning(f'No fixture for {request.command} {request.path}')
+            status = 404
+            text = json.dumps({'status': 'ERROR', 'code': 'RESOURCE_NOT_FOUND', 'message': f'No fixture for {request.command} {parts.path}'})
+        else:
+            self.count('served')
+            status = fixture['status']
+            text = fixture['text']
+            headers['Content-Type'] = fixture['content_type']
+            if fixture.get('retry_after'):
+                headers['Retry-After'] = fixture['retry_after']
+        content = text.encode('utf-8')
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            content = gzip.compress(content, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+        request.send_response(status)
+        headers.setdefault('Content-Type', 'application/json')
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.send_header('Content-Length', str(len(content)))
+        request.end_headers()
+        request.wfile.write(content)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a fixture archive recorded with `analyzer.py --record` as a local Harness API.')
+    parser.add_argument('fixtures', help='fixture archive (.jsonl.gz)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with injected 429s')
+    parser.add_argument('--seed', type=int, help='seed for the injected latency and faults')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    mock = MockHarness(
+        args.fixtures, args.host, args.port, args.latency, args.jitter,
+        args.error_rate, args.throttle_rate, args.retry_after, args.seed
+    )
+    print(f'Serving {len(mock.fixtures)} responses from {args.fixtures} at {mock.url}')
+    print(f'Run the analyzer with HARNESS_BASE_URL={mock.url}')
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+        print(f'Mock Harness: {mock.stats}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import sys
+import json
+import logging
+import argparse
+
+# Command line entry point. Only argparse is loaded up front: .env and logging are set up once the
+# command is known, before analyzer is imported (it reads its settings from the environment at
+# import), and each command only imports what it uses.
+COMMANDS = ('crawl', 'export', 'summarize', 'query', 'merge', 'serve')
+LOG_PATH = 'pipeline_analysis.log'
+
+def parse_shard(value):
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected I/N, got {value!r}')
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f'shard index must be between 0 and {count - 1}')
+    return index, count
+
+def add_filter_arguments(parser):
+    parser.add_argument('--org', action='append', metavar='GLOB', help='only orgs whose identifier matches (repeatable)')
+    parser.add_argument('--project', action='append', metavar='GLOB', help='only projects whose identifier matches (repeatable)')
+    parser.add_argument('--pipeline', action='append', metavar='GLOB', help='only pipelines whose identifier matches (repeatable)')
+
+def parse_filters(args):
+    filters = {level: patterns for level, patterns in (('org', args.org), ('project', args.project), ('pipeline', args.pipeline)) if patterns}
+    return filters or None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze the CI pipelines of a Harness account.')
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    crawl = commands.add_parser('crawl', help='crawl the account and write every output (the default)')
+    add_filter_arguments(crawl)
+    crawl.add_argument('--resume', action='store_true', help='skip the pipelines and projects already in the crawl journal of an interrupted run')
+    crawl.add_argument('--shard', type=parse_shard, metavar='I/N', help='analyze only shard I of N (0-based), e.g. 0/4')
+    crawl.add_argument('--shard-by', choices=['org', 'project'], default='org', help='split the account by org or by project (default: org)')
+    replay = crawl.add_mutually_exclusive_group()
+    replay.add_argument('--record', metavar='FIXTURES', help='save every API response to this fixture archive (.jsonl.gz)')
+    replay.add_argument('--replay', metavar='FIXTURES', help='serve the API from a recorded fixture archive instead of Harness')
+
+    export = commands.add_parser('export', help="rewrite the CSVs and spreadsheet from the last run's pipeline state, without calling the API")
+    export.add_argument('--state', metavar='PATH', help='pipeline state file (default: PIPELINE_STATE_PATH)')
+    export.add_argument('--no-spreadsheet', action='store_true', help='only write the CSVs')
+
+    summarize = commands.add_parser('summarize', help="print the org and account summaries from the last run's pipeline state")
+    summarize.add_argument('--state', metavar='PATH', help='pipeline state file (default: PIPELINE_STATE_PATH)')
+
+    query = commands.add_parser('query', help="look up template usage, infrastructure or a pipeline's templates in the last run's pipeline index")
+    query.add_argument('kind', choices=['template', 'infra', 'pipeline'])
+    query.add_argument('value', help='a templateRef (account.x, org.x or x), an infrastructure type, or org/project/pipeline')
+    query.add_argument('--version', help='only this versionLabel of the template')
+    query.add_argument('--org', help='only this org')
+    query.add_argument('--project', help='only this project')
+    query.add_argument('--index', metavar='PATH', help='pipeline index file (default: PIPELINE_INDEX_PATH)')
+    query.add_argument('--json', action='store_true', help='print the result as JSON')
+
+    merge = commands.add_parser('merge', help='merge the outputs of finished --shard runs into the current directory')
+    merge.add_argument('shard_dirs', nargs='+', metavar='SHARD_DIR')
+
+    serve = commands.add_parser('serve', help='keep the results in memory, refresh them incrementally and serve them over HTTP/JSON')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8000)
+    serve.add_argument('--interval', type=float, default=900, help='seconds between the end of a refresh and the start of the next (default: 900)')
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Without a command the script crawls, as it always has; the pre-subcommand flags still work
+    if not any(arg in COMMANDS for arg in argv) and not any(arg in ('-h', '--help') for arg in argv):
+        argv = ['crawl'] + argv
+    if '--merge' in argv:
+        argv = ['merge'] + argv[argv.index('--merge') + 1:]
+    return parser.parse_args(argv)
+
+def print_query_result(result, as_json=False):
+    if as_json:
+        print(json.dumps(result, indent=2))
+        return
+    for name, items in result.items():
+        print(f'{name} ({len(items)}):')
+        for item in items:
+            print(f'  {item}')
+
+def setup():
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
+    logging.basicConfig(filename=LOG_PATH, level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup()
+    import analyzer
+    if args.command == 'crawl':
+        shard = args.shard + (args.shard_by,) if args.shard else None
+        analyzer.run_crawl(resume=args.resume, shard=shard, filters=parse_filters(args), record=args.record, replay=args.replay)
+    elif args.command in ('export', 'summarize'):
+        state_path = args.state or analyzer.PIPELINE_STATE_PATH
+        try:
+            if args.command == 'export':
+                analyzer.export_results(state_path, spreadsheet=not args.no_spreadsheet)
+            else:
+                analyzer.summarize_results(state_path)
+        except FileNotFoundError as e:
+            sys.exit(str(e))
+    elif args.command == 'query':
+        try:
+            index = analyzer.load_index(args.index or analyzer.PIPELINE_INDEX_PATH)
+            result = analyzer.query_index(index, args.kind, args.value, args.version, args.org, args.project)
+        except (FileNotFoundError, ValueError) as e:
+            sys.exit(str(e))
+        print_query_result(result, args.json)
+    elif args.command == 'merge':
+        analyzer.merge_shards(args.shard_dirs)
+    elif args.command == 'serve':
+        import service
+        try:
+            service.serve(args.host, args.port, args.interval)
+        except ValueError as e:
+            sys.exit(str(e))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import logging
+import threading
+import email.utils
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, unquote, parse_qsl
+import analyzer
+
+# Service mode (`pipeline_analyzer.py serve`): keeps the account in memory, refreshes it with an
+# incremental crawl every refresh interval and answers summary queries over local HTTP/JSON. The
+# summaries are computed once per refresh, so a query is a dictionary lookup.
+
+class AccountModel:
+    # Summaries of one completed crawl, built from its pipeline records: the account, every org,
+    # every project, the records themselves for pipeline lookups and the pipeline index. projects
+    # is the state's org -> project identifiers, so orgs and projects without pipelines count.
+    def __init__(self, records, refreshed_at, index=None, projects=None):
+        self.refreshed_at = refreshed_at
+        if index is None:
+            index = analyzer.PipelineIndex()
+            index.add(records)
+        self.index = index
+        self.pipelines = {(record.org_identifier, record.project_identifier, record.pipeline_identifier): record for record in records}
+        self.project_pipelines = {}
+        org_partials = {}
+        self.org_projects = {}
+        for org_identifier, org_projects in analyzer.group_state_records(records, projects).items():
+            org_partial = org_partials[org_identifier] = analyzer.new_org_partial()
+            self.org_projects[org_identifier] = {}
+            for project_identifier, project_records in org_projects.items():
+                self.project_pipelines[(org_identifier, project_identifier)] = project_records
+                project_partial = analyzer.new_org_partial()
+                analyzer.add_project_to_partial(project_partial, project_records, {})
+                analyzer.merge_org_partials(org_partial, project_partial)
+                self.org_projects[org_identifier][project_identifier] = dict(
+                    analyzer.partial_summary(project_partial),
+                    total_errors=sum(1 for record in project_records if record.error is not None)
+                )
+        self.org_summary, self.account_summary = analyzer.summarize_partials(org_partials)
+        for org_identifier, summary in self.org_summary.items():
+            summary['total_projects'] = org_partials[org_identifier]['total_projects']
+
+def pipeline_view(record):
+    view = record.detail_row() or {
+        'pipeline_identifier': record.pipeline_identifier,
+        'org_identifier': record.org_identifier,
+        'project_identifier': record.project_identifier,
+        'pipeline_name': record.pipeline_name
+    }
+    view['last_updated_at'] = record.last_updated_at
+    view['error'] = record.error
+    return view
+
+class AnalyzerService:
+    # Local HTTP server over the current AccountModel, plus the refresh thread that replaces it.
+    # A refresh builds a new model and swaps it in whole, so queries never see a half-updated one;
+    # a failed refresh keeps serving the previous model. Refreshes always crawl the whole account:
+    # they replace the shared pipeline state, CSVs and index, which a scoped crawl would truncate.
+    def __init__(self, host='127.0.0.1', port=8000, interval=900):
+        self.interval = interval
+        self.model = None
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.stats = {'refreshes': 0, 'failures': 0, 'refreshing': False, 'last_refresh_seconds': None, 'last_error': None}
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def load(self):
+        # The last run's pipeline state answers queries until the first refresh finishes
+        state = analyzer.read_pipeline_state(analyzer.PIPELINE_STATE_PATH)
+        if state is not None:
+            records, projects = state
+            self.model = AccountModel(records, os.path.getmtime(analyzer.PIPELINE_STATE_PATH), self.load_index(), projects)
+            print(f'Loaded {len(records)} pipelines from {analyzer.PIPELINE_STATE_PATH}')
+
+    def load_index(self):
+        return analyzer.load_pipeline_index(analyzer.PIPELINE_INDEX_PATH) if analyzer.PIPELINE_INDEX_PATH else None
+
+    def refresh(self):
+        with self.lock:
+            self.stats['refreshing'] = True
+        start_time = time.monotonic()
+        try:
+            analyzer.run_crawl(incremental=True)
+            records, projects = analyzer.load_state_records(analyzer.PIPELINE_STATE_PATH)
+            self.model = AccountModel(records, time.time(), self.load_index(), projects)
+            with self.lock:
+                self.stats['refreshes'] += 1
+                self.stats['last_error'] = None
+            logging.info(f'Service refresh done: {len(records)} pipelines in {time.monotonic() - start_time:.1f}s')
+        except Exception as e:
+            with self.lock:
+                self.stats['failures'] += 1
+                self.stats['last_error'] = str(e)
+            logging.exception('Service refresh failed; still serving the previous results')
+        finally:
+            with self.lock:
+                self.stats['refreshing'] = False
+                self.stats['last_refresh_seconds'] = round(time.monotonic() - start_time, 3)
+
+    def refresh_loop(self):
+        # The interval counts from the end of a refresh; POST /refresh starts one right away
+        while not self.stopping.is_set():
+            self.refresh()
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def status(self):
+        model = self.model
+        with self.lock:
+            return dict(self.stats,
+                        refreshed_at=model.refreshed_at if model else None,
+                        pipelines=len(model.pipelines) if model else 0,
+                        interval_seconds=self.interval)
+
+    def query(self, parts, params=None):
+        # (status, body) for GET /<parts>?<params>
+        params = params or {}
+        if parts in ([], ['status']):
+            return 200, self.status()
+        model = self.model
+        if model is None:
+            return 503, {'error': 'No results yet; the first refresh is still running'}
+        org_identifier = parts[1] if len(parts) > 1 else None
+        project_identifier = parts[3] if len(parts) > 3 else None
+        if parts == ['account']:
+            return 200, model.account_summary
+        if parts == ['orgs']:
+            return 200, model.org_summary
+        if len(parts) == 2 and parts[0] in ('templates', 'infra'):
+            kind = 'template' if parts[0] == 'templates' else 'infra'
+            return 200, analyzer.query_index(model.index, kind, parts[1], params.get('version'), params.get('org'), params.get('project'))
+        if parts[0] != 'orgs' or org_identifier not in model.org_summary:
+            return 404, {'error': f'Not found: /{"/".join(parts)}'}
+        projects = model.org_projects.get(org_identifier, {})
+        if len(parts) == 2:
+            return 200, model.org_summary[org_identifier]
+        if len(parts) == 3 and parts[2] == 'projects':
+            return 200, projects
+        if parts[2] == 'projects' and project_identifier in projects:
+            records = model.project_pipelines[(org_identifier, project_identifier)]
+            if len(parts) == 4:
+                return 200, projects[project_identifier]
+            if len(parts) == 5 and parts[4] == 'pipelines':
+                return 200, [pipeline_view(record) for record in records]
+            record = model.pipelines.get((org_identifier, project_identifier, parts[5])) if len(parts) in (6, 7) and parts[4] == 'pipelines' else None
+            if record and len(parts) == 6:
+                return 200, pipeline_view(record)
+            if record and parts[6] == 'templates':
+                return 200, analyzer.query_index(model.index, 'pipeline', '/'.join(parts[1:6:2]))
+        return 404, {'error': f'Not found: /{"/".join(parts)}'}
+
+    def handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                parts = [unquote(part) for part in url.path.split('/') if part]
+                try:
+                    status, body = service.query(parts, dict(parse_qsl(url.query)))
+                except ValueError as e:
+                    status, body = 404, {'error': str(e)}
+                self.respond(status, body)
+
+            def do_POST(self):
+                if urlsplit(self.path).path.rstrip('/') != '/refresh':
+                    self.respond(404, {'error': f'Not found: {self.path}'})
+                    return
+                service.wake.set()
+                self.respond(202, service.status())
+
+            def respond(self, status, body):
+                content = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                model = service.model
+                if model:
+                    self.send_header('Last-Modified', email.utils.formatdate(model.refreshed_at, usegmt=True))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                logging.info(f'{self.address_string()} {format % args}')
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.refresh_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.stopping.set()
+        self.wake.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+def serve(host='127.0.0.1', port=8000, interval=900):
+    if not analyzer.PIPELINE_STATE_PATH:
+        raise ValueError('Service mode reads its results from the pipeline state; set PIPELINE_STATE_PATH')
+    service = AnalyzerService(host, port, interval)
+    service.load()
+    service.start()
+    print(f'Serving account summaries at {service.url}, refreshing every {interval}s')
+    logging.info(f'Service listening on {service.url}, refresh interval {interval}s')
+    try:
+        service.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.server.server_close()
+        print(f'Service stopped: {service.status()}')
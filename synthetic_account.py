@@ -0,0 +1,242 @@
+import json
+import time
+import gzip
+import random
+import argparse
+import yaml
+from urllib.parse import urlencode
+
+# Synthetic Harness accounts for benchmarks. Every project gets a chain of templates that
+# reference each other across the project, org and account levels. Pipelines mix plain, template
+# and nested `parallel` stages, and executions carry large layoutNodeMaps. Accounts are written
+# as fixture archives that mock_harness.py serves, or used in memory by benchmark_cpu.py.
+INFRA_TYPES = ['KubernetesDirect', 'VM', 'Docker', 'HostedVm']
+NODE_TYPES = ['CI', 'CI', 'Deployment', 'Approval', 'Custom']
+
+def template_chain(org_identifier, project_identifier, depth):
+    # Keys (scope, org, project, identifier, versionLabel) from the project-level head of the
+    # chain down to the account-level CI stage template at its end
+    chain = []
+    for level in range(depth):
+        if level == 0 and depth > 2:
+            chain.append(('project', org_identifier, project_identifier, f'chain_{level}', 'v1'))
+        elif level == 1 and depth > 2:
+            chain.append(('org', org_identifier, None, f'chain_{level}', 'v1'))
+        else:
+            chain.append(('account', None, None, f'chain_{level}', 'v1'))
+    return chain
+
+def template_ref(key):
+    scope, _, _, identifier, _ = key
+    return identifier if scope == 'project' else f'{scope}.{identifier}'
+
+def chain_templates(chain, rnd):
+    # Each template but the last is a stage group whose stages include the next one in the chain
+    templates = {}
+    for level, key in enumerate(chain):
+        if level == len(chain) - 1:
+            document = {'template': {'name': key[3], 'identifier': key[3], 'versionLabel': key[4], 'type': 'Stage', 'spec': {
+                'type': 'CI', 'infrastructure': {'type': rnd.choice(INFRA_TYPES)},
+                'execution': {'steps': [{'step': {'type': 'Run', 'name': f'step{step}', 'spec': {'command': 'make build'}}} for step in range(5)]}
+            }}}
+        else:
+            next_key = chain[level + 1]
+            document = {'template': {'name': key[3], 'identifier': key[3], 'versionLabel': key[4], 'type': 'Pipeline', 'spec': {'stages': [
+                {'stage': {'name': 'chained', 'identifier': 'chained', 'template': {'templateRef': template_ref(next_key), 'versionLabel': next_key[4]}}},
+                {'stage': {'name': 'deploy', 'identifier': 'deploy', 'type': 'Deployment', 'spec': {}}}
+            ]}}}
+        templates[key] = yaml.safe_dump(document, sort_keys=False)
+    return templates
+
+def ci_stage(name, rnd, steps):
+    return {'stage': {'name': name, 'identifier': name, 'type': 'CI', 'spec': {
+        'infrastructure': {'type': rnd.choice(INFRA_TYPES)},
+        'execution': {'steps': [{'step': {'type': 'Run', 'name': f'step{step}', 'identifier': f'step{step}', 'spec': {'command': f'./run.sh {step}'}}} for step in range(steps)]}
+    }}}
+
+def parallel_block(name, rnd, depth, width, steps):
+    # Nested `parallel` blocks, depth levels deep
+    branches = [ci_stage(f'{name}_{branch}', rnd, steps) if branch % 2 == 0 else {'stage': {'name': f'{name}_{branch}', 'identifier': f'{name}_{branch}', 'type': 'Deployment', 'spec': {}}} for branch in range(width)]
+    if depth > 1:
+        branches.append(parallel_block(f'{name}_p', rnd, depth - 1, width, steps))
+    return {'parallel': branches}
+
+def pipeline_document(pipeline_identifier, chain, rnd, stages, parallel_depth, steps):
+    stage_list = []
+    for index in range(stages):
+        kind = rnd.random()
+        name = f's{index}'
+        if kind < 0.35:
+            stage_list.append(ci_stage(name, rnd, steps))
+        elif kind < 0.55:
+            head = chain[rnd.randrange(len(chain))]
+            stage_list.append({'stage': {'name': name, 'identifier': name, 'template': {'templateRef': template_ref(head), 'versionLabel': head[4]}}})
+        elif kind < 0.75 and parallel_depth:
+            stage_list.append(parallel_block(name, rnd, parallel_depth, 3, steps))
+        else:
+            stage_list.append({'stage': {'name': name, 'identifier': name, 'type': 'Deployment', 'spec': {'execution': {'steps': []}}}})
+    return {'pipeline': {'name': pipeline_identifier, 'identifier': pipeline_identifier, 'stages': stage_list}}
+
+def execution_summary(pipeline_identifier, index, start_ts, rnd, nodes):
+    layout_node_map = {}
+    node_start = start_ts
+    for node in range(nodes):
+        node_id = f'node{node}'
+        duration = rnd.randint(5_000, 900_000)
+        layout_node_map[node_id] = {
+            'nodeType': rnd.choice(NODE_TYPES),
+            'nodeGroup': 'STAGE',
+            'nodeIdentifier': node_id,
+            'name': f'Stage {node}',
+            'nodeUuid': f'{pipeline_identifier}-{index}-{node}',
+            'status': 'Success',
+            'module': 'ci',
+            'moduleInfo': {'ci': {'buildType': 'branch', 'branch': 'main', 'commits': [{'id': f'{rnd.getrandbits(64):016x}', 'message': 'Update dependencies'}]}},
+            'startTs': node_start,
+            'endTs': node_start + duration,
+            'edgeLayoutList': {'currentNodeChildren': [], 'nextIds': [f'node{node + 1}'] if node + 1 < nodes else []},
+            'nodeRunInfo': {'whenCondition': '<+OnPipelineSuccess>', 'evaluatedCondition': True}
+        }
+        node_start += duration
+    return {
+        'pipelineIdentifier': pipeline_identifier,
+        'planExecutionId': f'{pipeline_identifier}-{index}',
+        'runSequence': index,
+        'status': 'Success' if index else 'Running',
+        'startTs': start_ts,
+        'endTs': node_start,
+        'layoutNodeMap': layout_node_map,
+        'startingNodeId': 'node0'
+    }
+
+def generate_account(orgs=3, projects=5, pipelines=20, stages=8, parallel_depth=3, template_depth=4, executions=20, nodes=30, steps=5, seed=0, now=None):
+    # Executions start within the last week, relative to now (epoch ms), so they fall inside the
+    # default execution window
+    rnd = random.Random(seed)
+    now = now or int(time.time() * 1000)
+    account = {'orgs': [], 'projects': {}, 'pipelines': {}, 'pipeline_yaml': {}, 'templates': {}, 'executions': {}}
+    for org_index in range(orgs):
+        org_identifier = f'org_{org_index}'
+        account['orgs'].append(org_identifier)
+        account['projects'][org_identifier] = []
+        for project_index in range(projects):
+            project_identifier = f'project_{org_index}_{project_index}'
+            account['projects'][org_identifier].append(project_identifier)
+            chain = template_chain(org_identifier, project_identifier, template_depth)
+            for key, raw_yaml in chain_templates(chain, rnd).items():
+                account['templates'].setdefault(key, raw_yaml)
+            pipeline_list = []
+            for pipeline_index in range(pipelines):
+                pipeline_identifier = f'pipeline_{org_index}_{project_index}_{pipeline_index}'
+                pipeline_list.append({
+                    'identifier': pipeline_identifier,
+                    'name': f'Pipeline {pipeline_index}',
+                    'storeType': 'INLINE',
+                    'lastUpdatedAt': now - pipeline_index * 60_000,
+                    'modules': ['ci', 'pms'],
+                    'stageCount': stages
+                })
+                document = pipeline_document(pipeline_identifier, chain, rnd, stages, parallel_depth, steps)
+                account['pipeline_yaml'][(org_identifier, project_identifier, pipeline_identifier)] = yaml.safe_dump(document, sort_keys=False)
+                account['executions'][(org_identifier, project_identifier, pipeline_identifier)] = [
+                    execution_summary(pipeline_identifier, index, now - index * 3_600_000 - rnd.randint(0, 3_000_000), rnd, nodes)
+                    for index in range(executions)
+                ]
+            account['pipelines'][(org_identifier, project_identifier)] = pipeline_list
+    return account
+
+def page_of(items, page, page_size):
+    total_pages = -(-len(items) // page_size) if items else 0
+    return {'content': items[page * page_size:(page + 1) * page_size], 'pageIndex': page, 'pageSize': page_size, 'totalItems': len(items), 'totalPages': total_pages}
+
+def pages(items, page_size):
+    for page in range(max(-(-len(items) // page_size), 1)):
+        yield page, page_of(items, page, page_size)
+
+def fixture(method, path, params, body, data):
+    return {
+        'method': method,
+        'path': path,
+        'query': urlencode(params),
+        'body': body,
+        'status': 200,
+        'content_type': 'application/json',
+        'retry_after': None,
+        'text': json.dumps({'status': 'SUCCESS', 'data': data})
+    }
+
+def account_fixtures(account, page_size=100, execution_page_size=20, project_page_size=100):
+    # The responses a crawl of the account requests, in mock_harness's fixture format. Execution
+    # summaries are included for both EXECUTION_FETCH_MODE=pipeline and project.
+    organizations = [{'organization': {'identifier': org, 'name': org}} for org in account['orgs']]
+    for page, data in pages(organizations, page_size):
+        yield fixture('GET', '/gateway/ng/api/organizations', {'pageIndex': page, 'pageSize': page_size}, None, data)
+    for org_identifier, project_identifiers in account['projects'].items():
+        projects = [{'projectResponse': {'project': {'orgIdentifier': org_identifier, 'identifier': project, 'name': project}}} for project in project_identifiers]
+        for page, data in pages(projects, page_size):
+            params = {'orgIdentifier': org_identifier, 'pageIndex': page, 'pageSize': page_size, 'sortOrders': 'createdAt,DESC'}
+            yield fixture('GET', '/gateway/ng/api/aggregate/projects', params, None, data)
+    for (org_identifier, project_identifier), pipeline_list in account['pipelines'].items():
+        for page, data in pages(pipeline_list, page_size):
+            params = {'projectIdentifier': project_identifier, 'orgIdentifier': org_identifier, 'page': page, 'sort': 'lastUpdatedAt,DESC', 'size': page_size}
+            yield fixture('POST', '/gateway/pipeline/api/pipelines/list', params, {'filterType': 'PipelineSetup'}, data)
+        project_executions = []
+        for pipeline in pipeline_list:
+            key = (org_identifier, project_identifier, pipeline['identifier'])
+            params = {'orgIdentifier': org_identifier, 'projectIdentifier': project_identifier, 'validateAsync': 'true'}
+            yield fixture('GET', f'/gateway/pipeline/api/pipelines/{pipeline["identifier"]}', params, None, {'yamlPipeline': account['pipeline_yaml'][key]})
+            executions = account['executions'][key]
+            project_executions.extend(executions)
+            for page, data in pages(executions, execution_page_size):
+                params = {'orgIdentifier': org_identifier, 'projectIdentifier': project_identifier, 'pipelineIdentifier': pipeline['identifier'], 'page': page, 'size': execution_page_size, 'showAllExecutions': 'true', 'getDefaultFromOtherRepo': 'true'}
+                yield fixture('POST', '/pipeline/api/pipelines/execution/summary', params, {'filterType': 'PipelineExecution'}, data)
+        project_executions.sort(key=lambda execution: execution['startTs'], reverse=True)
+        for page, data in pages(project_executions, project_page_size):
+            params = {'orgIdentifier': org_identifier, 'projectIdentifier': project_identifier, 'page': page, 'size': project_page_size, 'showAllExecutions': 'true', 'getDefaultFromOtherRepo': 'true'}
+            yield fixture('POST', '/pipeline/api/pipelines/execution/summary', params, {'filterType': 'PipelineExecution'}, data)
+    for (scope, org_identifier, project_identifier, template_id, version_label), raw_yaml in account['templates'].items():
+        params = {'loadFromFallbackBranch': 'true'}
+        if scope in ('org', 'project'):
+            params['orgIdentifier'] = org_identifier
+        if scope == 'project':
+            params['projectIdentifier'] = project_identifier
+        params['versionLabel'] = version_label
+        yield fixture('GET', f'/gateway/template/api/templates/{template_id}', params, None, {'yaml': raw_yaml})
+
+def write_fixtures(account, path, **page_sizes):
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+        for response in account_fixtures(account, **page_sizes):
+            file.write(json.dumps(response) + '\n')
+            count += 1
+    return count
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic Harness account as a fixture archive for mock_harness.py and benchmark.py.')
+    parser.add_argument('output', help='fixture archive to write (.jsonl.gz)')
+    parser.add_argument('--orgs', type=int, default=3)
+    parser.add_argument('--projects', type=int, default=5, help='projects per org')
+    parser.add_argument('--pipelines', type=int, default=20, help='pipelines per project')
+    parser.add_argument('--stages', type=int, default=8, help='top-level stages per pipeline')
+    parser.add_argument('--parallel-depth', type=int, default=3, help='nesting depth of parallel stage blocks')
+    parser.add_argument('--template-depth', type=int, default=4, help='length of the project -> org -> account template chains')
+    parser.add_argument('--executions', type=int, default=20, help='executions per pipeline')
+    parser.add_argument('--nodes', type=int, default=30, help='layoutNodeMap entries per execution')
+    parser.add_argument('--steps', type=int, default=5, help='steps per CI stage')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--page-size', type=int, default=100, help='PAGE_SIZE the analyzer will run with')
+    parser.add_argument('--execution-page-size', type=int, default=20, help='EXECUTION_PAGE_SIZE the analyzer will run with')
+    parser.add_argument('--project-page-size', type=int, default=100, help='EXECUTION_PROJECT_PAGE_SIZE the analyzer will run with')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    account = generate_account(
+        args.orgs, args.projects, args.pipelines, args.stages, args.parallel_depth,
+        args.template_depth, args.executions, args.nodes, args.steps, args.seed
+    )
+    count = write_fixtures(account, args.output, page_size=args.page_size, execution_page_size=args.execution_page_size, project_page_size=args.project_page_size)
+    print(f'Wrote {count} responses for {len(account["pipeline_yaml"])} pipelines and {len(account["templates"])} templates to {args.output}')
+
+if __name__ == "__main__":
+    main()